@@ -0,0 +1,139 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, TypedDict
+
+
+class AdmissionRejected(Exception):
+    '''
+    Raised when a search is shed, the queue is full or the wait for a slot timed out
+    '''
+
+    def __init__(self, retry_after: int) -> None:
+        super().__init__('Too many concurrent searches')
+        self.retry_after = retry_after
+
+
+class ClientDisconnected(Exception):
+    '''
+    Raised when the HTTP client went away before its search completed
+    '''
+
+
+class AdmissionMetrics(TypedDict):
+    in_flight: int
+    queue_depth: int
+    max_concurrency: int
+    max_queue: int
+    admitted_total: int
+    shed_total: int
+    timeout_total: int
+    cancelled_total: int
+
+
+class AdmissionController:
+    '''
+    Bounds the number of concurrent ES searches of a worker
+
+    Searches over `max_concurrency` wait in a queue of at most `max_queue` searches
+    for up to `queue_timeout` seconds, after which they are shed.
+
+    Attributes:
+        _semaphore: slots for concurrent ES searches
+        in_flight: searches currently running against ES
+        queue_depth: searches waiting for a slot
+    '''
+
+    def __init__(
+        self,
+        max_concurrency: int = 32,
+        max_queue: int = 128,
+        queue_timeout: float = 1.0,
+        retry_after: int = 1
+    ) -> None:
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._max_concurrency = max_concurrency
+        self._max_queue = max_queue
+        self._queue_timeout = queue_timeout
+        self._retry_after = retry_after
+        self.in_flight = 0
+        self.queue_depth = 0
+        self.admitted_total = 0
+        self.shed_total = 0
+        self.timeout_total = 0
+        self.cancelled_total = 0
+
+    @asynccontextmanager
+    async def admit(self) -> AsyncIterator[None]:
+        '''
+        Holds a search slot for the duration of the context
+
+        Raises AdmissionRejected if the queue is full or no slot frees up in time
+        '''
+        if self._semaphore.locked() and self.queue_depth >= self._max_queue:
+            self.shed_total += 1
+            raise AdmissionRejected(self._retry_after)
+        self.queue_depth += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self._queue_timeout)
+        except asyncio.TimeoutError:
+            self.shed_total += 1
+            raise AdmissionRejected(self._retry_after)
+        finally:
+            self.queue_depth -= 1
+        self.admitted_total += 1
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    async def run(
+        self,
+        coro: Awaitable[Any],
+        timeout: float,
+        is_disconnected: Callable[[], Awaitable[bool]],
+        poll_interval: float = 0.1
+    ) -> Any:
+        '''
+        Runs an admitted search, cancelling it when the deadline passes or the client disconnects
+
+        Cancelling the task closes its ES connection, which cancels the search on the ES side.
+
+        :param coro: the ES search
+        :param timeout: seconds before the search is cancelled
+        :param is_disconnected: async callable, True once the HTTP client went away
+        :param poll_interval: seconds between two client disconnection checks (optional)
+
+        Raises asyncio.TimeoutError or ClientDisconnected when the search is cancelled
+        '''
+        task = asyncio.ensure_future(coro)
+        deadline = time.monotonic() + timeout
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                done, _ = await asyncio.wait({task}, timeout=min(poll_interval, max(remaining, 0)))
+                if done:
+                    return task.result()
+                if await is_disconnected():
+                    self.cancelled_total += 1
+                    raise ClientDisconnected()
+                if remaining <= 0:
+                    self.timeout_total += 1
+                    raise asyncio.TimeoutError()
+        finally:
+            if not task.done():
+                task.cancel()
+
+    def metrics(self) -> AdmissionMetrics:
+        return {
+            'in_flight': self.in_flight,
+            'queue_depth': self.queue_depth,
+            'max_concurrency': self._max_concurrency,
+            'max_queue': self._max_queue,
+            'admitted_total': self.admitted_total,
+            'shed_total': self.shed_total,
+            'timeout_total': self.timeout_total,
+            'cancelled_total': self.cancelled_total,
+        }
@@ -0,0 +1,156 @@
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import time
+from typing import Any, Union
+
+
+def make_cache_key(*parts: Any) -> str:
+    '''
+    Builds a stable cache key from the given values (ex: the search parameters)
+    '''
+    raw = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+class MemoryCache:
+    '''
+    Per-process cache, each worker holds its own entries
+
+    Attributes:
+        _ttl: seconds an entry is valid for
+        _entries: dict of key to (expiry timestamp, value)
+    '''
+
+    def __init__(self, ttl: int = 60, max_entries: int = 10000) -> None:
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._entries: dict[str, tuple[float, Any]] = {}
+
+    async def get(self, key: str) -> Union[Any, None]:
+        entry = self._entries.get(key)
+        if not entry:
+            return None
+        expires, value = entry
+        if expires < time.time():
+            self._entries.pop(key, None)
+            return None
+        return value
+
+    async def set(self, key: str, value: Any) -> None:
+        if len(self._entries) >= self._max_entries:
+            # dropping the oldest entry, dicts keep insertion order
+            self._entries.pop(next(iter(self._entries)))
+        self._entries[key] = (time.time() + self._ttl, value)
+
+    async def clear(self) -> None:
+        self._entries.clear()
+
+    async def close(self) -> None:
+        self._entries.clear()
+
+
+class FileCache:
+    '''
+    Cache shared by every worker that can reach the same directory
+
+    Local stand-in for a shared cache tier: entries are JSON files, written atomically
+    so concurrent workers never read a partial entry. Pointing `cache_dir` at a shared
+    volume shares the cache across hosts.
+    Expired entries are deleted when read, and every `ttl` seconds a sweep deletes the expired
+    entries, then the oldest ones over `max_entries`.
+
+    Attributes:
+        _ttl: seconds an entry is valid for
+        _cache_dir: directory holding the entries
+        _max_entries: number of entries kept by a sweep
+        _next_sweep: timestamp of the next sweep
+    '''
+
+    def __init__(self, cache_dir: str, ttl: int = 60, max_entries: int = 10000) -> None:
+        self._ttl = ttl
+        self._cache_dir = cache_dir
+        self._max_entries = max_entries
+        self._next_sweep = time.time() + ttl
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self._cache_dir, f'{key}.json')
+
+    def _read(self, key: str) -> Union[Any, None]:
+        try:
+            with open(self._path(key), 'r') as f:
+                entry = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        if entry['expires'] < time.time():
+            self._remove(self._path(key))
+            return None
+        return entry['value']
+
+    def _remove(self, path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            # already removed by another worker
+            pass
+
+    def _scan_entries(self) -> list[os.DirEntry]:
+        with os.scandir(self._cache_dir) as entries:
+            return [entry for entry in entries if entry.name.endswith('.json')]
+
+    def _sweep(self) -> None:
+        now = time.time()
+        kept = []
+        for entry in self._scan_entries():
+            try:
+                mtime = entry.stat().st_mtime
+            except FileNotFoundError:
+                continue
+            # entries are written with expires = mtime + ttl
+            if mtime + self._ttl < now:
+                self._remove(entry.path)
+            else:
+                kept.append((mtime, entry.path))
+        if len(kept) > self._max_entries:
+            kept.sort()
+            for _, path in kept[:len(kept) - self._max_entries]:
+                self._remove(path)
+
+    def _clear(self) -> None:
+        for entry in self._scan_entries():
+            self._remove(entry.path)
+
+    def _write(self, key: str, value: Any) -> None:
+        fd, tmp_path = tempfile.mkstemp(dir=self._cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'expires': time.time() + self._ttl, 'value': value}, f)
+        os.replace(tmp_path, self._path(key))
+
+    async def get(self, key: str) -> Union[Any, None]:
+        return await asyncio.to_thread(self._read, key)
+
+    async def set(self, key: str, value: Any) -> None:
+        await asyncio.to_thread(self._write, key, value)
+        if time.time() >= self._next_sweep:
+            self._next_sweep = time.time() + self._ttl
+            await asyncio.to_thread(self._sweep)
+
+    async def clear(self) -> None:
+        await asyncio.to_thread(self._clear)
+
+    async def close(self) -> None:
+        return
+
+
+def create_cache(backend: str, cache_dir: str = None, ttl: int = 60) -> Union[MemoryCache, FileCache]:
+    '''
+    Creates the cache for the configured backend, `memory` or `file`
+    '''
+    if backend == 'memory':
+        return MemoryCache(ttl=ttl)
+    if backend == 'file':
+        return FileCache(cache_dir, ttl=ttl)
+    raise Exception('Unknown cache backend: ', backend)
@@ -6,12 +6,27 @@ from typing import List, Union
 from elastic_transport import (ConnectionError, HeadApiResponse,
                                ObjectApiResponse)
 from elasticsearch import AsyncElasticsearch
+from elasticsearch.helpers import async_scan
 
-from .es_types import IndexDocWithHighlight, SearchHit, SearchRequestResult
+from .es_types import (AggregationResult, IndexDocWithHighlight, SearchHit,
+                       SearchRequestResult)
 from .index.index_mappings import default_mapping
 from .index.index_settings import create_settings
-from .utils.bulk_data_helper import actions_list_gen
+from .utils.bulk_data_helper import bulk_body_gen
 from .utils.get_es_config import get_es_client_config
+from .utils.match_positions import (compile_match_pattern,
+                                    find_match_positions, get_snippets)
+from .utils.snapshot import SnapshotWriter
+
+# bulk requests in flight while populating an index
+MAX_CONCURRENT_BULK_REQUESTS = 4
+# share of a search deadline sent to ES as the search `timeout`, the rest leaves ES time
+# to return its partial results before the request itself times out
+ES_TIMEOUT_RATIO = 0.8
+# documents packed at a time in a thread while writing a snapshot
+SNAPSHOT_BATCH_SIZE = 1000
+# key of the index mapping `_meta` set once an index is fully populated
+POPULATED_META_KEY = 'populated'
 
 
 class ElasticSearchClient:
@@ -105,19 +120,43 @@ class ElasticSearchClient:
             )
         return create_result['acknowledged']
 
+    async def is_populated(self, index: str = None) -> bool:
+        '''
+        Returns True if the population of an index completed, see `mark_populated`
+        '''
+        if not index:
+            index = self.index_name
+        mapping_response: ObjectApiResponse = await self._client.indices.get_mapping(index=index)
+        return any(
+            mapping['mappings'].get('_meta', {}).get(POPULATED_META_KEY)
+            for mapping in mapping_response.body.values()
+        )
+
+    async def mark_populated(self, index: str = None) -> None:
+        '''
+        Records in the index mapping `_meta` that the population of an index completed
+
+        An index that exists without this marker was left partially populated, 
+        ex: by a leader that exited while populating it.
+        '''
+        if not index:
+            index = self.index_name
+        await self._client.indices.put_mapping(index=index, meta={POPULATED_META_KEY: True})
+
     async def initialize_es(
         self,
         index: str = None,
         populate: bool = False,
         files_dir: str = None,
         chunk_size: int = 50
-    ) -> None:
+    ) -> bool:
         '''
         Async initialize (or create if not existing) an ES index
 
         Checks if the specified index exists, if it doesn't, creates it.
         If the `populate` flag is set to True, will populate the index.
-        If the index already exists, will only populate if the index is empty.
+        If the index already exists, will only populate it if its population did not complete 
+        (see `mark_populated`): the partially populated index is deleted and populated again.
 
         :param index: name of the index to initialize (optional)
         :param populate: if True, populates the index using (optional)
@@ -125,29 +164,30 @@ class ElasticSearchClient:
         :param chuck_size: number of documents to send in a single bulk request, 
                             deault is 50 (optional)
 
+        Returns True if the index was populated
         '''
         if not index:
             index = self.index_name
         logging.info('[ INFO ] - Initializing ES index: %s', index)
         is_initalized = await self.is_initalized(index=index)
-        if not is_initalized:
-            create_result = await self.create_index(index)
-            if create_result:
-                if populate:
-                    await self.populate_index(
-                        index=index,
-                        files_dir=files_dir,
-                        chuck_size=chunk_size
-                    )
-            else:
-                raise Exception('Failed to create index: ', index)
-        else:
-            logging.info('[ INFO ] - %s already exists', index)
-            if populate:
-                count_response: ObjectApiResponse = await self._client.count(index=index)
-                # If there are no documents in the index, will populate from json files
-                if not count_response['count']:
-                    await self.populate_index()
+        if is_initalized:
+            if not populate or await self.is_populated(index):
+                logging.info('[ INFO ] - %s already exists', index)
+                return False
+            # documents indexed with generated ids can not be told apart, starting over
+            logging.warning('[ WARNING ] - %s was not fully populated, recreating it', index)
+            await self._client.indices.delete(index=index)
+        create_result = await self.create_index(index)
+        if not create_result:
+            raise Exception('Failed to create index: ', index)
+        if not populate:
+            return False
+        await self.populate_index(
+            index=index,
+            files_dir=files_dir,
+            chuck_size=chunk_size
+        )
+        return True
 
     async def populate_index(self, index: str = None, files_dir: str = None, chuck_size: int = 50) -> None:
         '''
@@ -156,6 +196,11 @@ class ElasticSearchClient:
         Retrieves JSON data, adds it to the Elasticsearch index in bulk, 
         using chunks of a specified size. If no directory path, it defaults to the class's 
         configuration for the data files directory path.
+        Chunks are sent to `_bulk` as pre-serialized NDJSON bodies as soon as they are built,
+        with at most `MAX_CONCURRENT_BULK_REQUESTS` requests in flight. Once they are all sent,
+        the index is marked as populated (see `mark_populated`).
+        When a snapshot path is configured, a snapshot of the index is written from ES 
+        once the documents are indexed (see `write_snapshot`).
 
         :param index: name of the index to populate
         :param files_dir: directory path where the JSON files are located (optional)
@@ -167,25 +212,128 @@ class ElasticSearchClient:
 
         if not index:
             index = self.index_name
+        # the configured snapshot holds the documents of the default index
+        snapshot_path = self._config['snapshot_path'] if index == self.index_name else None
         if not files_dir:
             files_dir = self._config['data_files_dir_path']
         if not os.path.exists(files_dir):
             raise Exception('No directory exists at: ', files_dir)
         logging.info(
             '[ INFO ] - Populating index from files located in directory: %s', files_dir)
-        files_gen = actions_list_gen(files_dir, index, chuck_size)
-        tasks = []
-        while files_gen:
-            try:
-                actions_list, count = next(files_gen)
-                if actions_list:
-                    logging.info(f'Adding {count} to bulk insert!')
-                    tasks.append(self._client.bulk(operations=actions_list))
-            except StopIteration:
-                break
-            except Exception as error:
-                raise error
-        await asyncio.gather(*tasks)
+        # bodies are pre-serialized NDJSON, sent to `_bulk` as is
+        bodies_gen = bulk_body_gen(files_dir, index, chuck_size)
+        # chunks are sent as they are produced, at most MAX_CONCURRENT_BULK_REQUESTS at a time,
+        # so only a few bodies are held in memory whatever the size of the corpus
+        pending = set()
+        failed = 0
+        try:
+            for body, count in bodies_gen:
+                if len(pending) >= MAX_CONCURRENT_BULK_REQUESTS:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        failed += self._log_bulk_errors(task.result())
+                logging.info(f'Adding {count} to bulk insert!')
+                pending.add(asyncio.ensure_future(self._client.bulk(operations=body)))
+            for response in await asyncio.gather(*pending):
+                failed += self._log_bulk_errors(response)
+        except Exception as error:
+            for task in pending:
+                task.cancel()
+            raise error
+        if failed:
+            logging.error('[ ERROR ] - %s documents were not indexed in: %s', failed, index)
+        await self.mark_populated(index)
+        if snapshot_path:
+            await self._refresh_snapshot(snapshot_path, index)
+
+    async def _refresh_snapshot(self, path: str, index: str) -> None:
+        '''
+        Writes the snapshot of a freshly populated index
+
+        The snapshot is optional: on failure it is logged and the previous snapshot, 
+        now out of date, is removed, the ingestion itself is not failed.
+        '''
+        try:
+            # making the indexed documents visible to the scroll
+            await self._client.indices.refresh(index=index)
+            count = await self.write_snapshot(path, index)
+            logging.info('[ INFO ] - Wrote snapshot of %s documents: %s', count, path)
+        except Exception:
+            logging.exception('[ ERROR ] - Failed to write the snapshot: %s', path)
+            if os.path.exists(path):
+                os.remove(path)
+
+    @staticmethod
+    def _log_bulk_errors(response: ObjectApiResponse) -> int:
+        '''
+        Logs the documents rejected by a `_bulk` request, returns their count
+        '''
+        if not response['errors']:
+            return 0
+        errors = [item['index']['error'] for item in response['items'] if 'error' in item['index']]
+        logging.error(
+            '[ ERROR ] - %s documents rejected by a bulk request, first error: %s',
+            len(errors), errors[0] if errors else None
+        )
+        return len(errors)
+
+    async def write_snapshot(self, path: str = None, index: str = None) -> int:
+        '''
+        Async write a snapshot of all the documents of an index
+
+        Scrolls through the index, for indexes that were populated without a snapshot.
+
+        :param path: path of the snapshot file, defaults to the configured snapshot path (optional)
+        :param index: name of the index to snapshot (optional)
+
+        Returns the number of documents in the snapshot
+        '''
+        if not index:
+            index = self.index_name
+        if not path:
+            path = self._config['snapshot_path']
+        if not path:
+            raise Exception('No snapshot path, set `snapshot_file_name` in config.ini')
+        snapshot_writer = SnapshotWriter()
+        batch = []
+        async for hit in async_scan(
+            self._client,
+            index=index,
+            query={'query': {'match_all': {}}},
+            _source=['name', 'bases', 'createdAt', 'creator.id']
+        ):
+            batch.append((hit['_id'], hit['_source']))
+            if len(batch) == SNAPSHOT_BATCH_SIZE:
+                # packing the bases is CPU bound, off the event loop
+                await asyncio.to_thread(snapshot_writer.add_all, batch)
+                batch = []
+        await asyncio.to_thread(snapshot_writer.add_all, batch)
+        await asyncio.to_thread(snapshot_writer.write, path)
+        return snapshot_writer.count
+
+    def _build_text_query(self, text: str, fields: List[str] = None) -> dict:
+        '''
+        Builds the query matching `text` anywhere in the given fields, defaults to ['bases']
+        '''
+        if fields:
+            # filtering any values that are not existing properties of the index document
+            fields = list(filter(lambda it: it in [
+                          'bases', 'name', 'creator.handle', 'creator.name', 'creator.id'], fields))
+        if not fields:
+            fields = ['bases']
+        return {"query_string": {'query': f'*{text}*', 'fields': fields}}
+
+    def _with_timeout(self, timeout: float = None) -> tuple[AsyncElasticsearch, Union[str, None]]:
+        '''
+        Returns the client to use for a search with a deadline in seconds, and the ES `timeout`
+
+        The request times out at the deadline, the ES search `timeout` is `ES_TIMEOUT_RATIO`
+        of it so partial results come back before the request is dropped.
+        '''
+        if not timeout:
+            return self._client, None
+        search_timeout = f'{int(timeout * ES_TIMEOUT_RATIO * 1000)}ms'
+        return self._client.options(request_timeout=timeout), search_timeout
 
     async def search_index(
         self,
@@ -195,7 +343,10 @@ class ElasticSearchClient:
         page: int = 0,
         size: int = 20,
         with_highlight: bool = False,
-        return_fields: List[str] = None
+        return_fields: List[str] = None,
+        timeout: float = None,
+        with_positions: bool = False,
+        snippet_window: int = 0
     ) -> SearchRequestResult:
         '''
         Async search an index based on the given text and criteria, 
@@ -209,56 +360,145 @@ class ElasticSearchClient:
         :param with_highlight: if True, includes highlighted snippets in the results, 
                             defaults to False (optional)
         :param return_fields: fields to return in the results. default returns all (optional)
+        :param timeout: deadline in seconds, used as the request timeout, part of it is sent 
+                            as the ES search `timeout` (partial results are returned 
+                            when it expires), see `_with_timeout` (optional)
+        :param with_positions: if True, includes the [start, end] offsets of the text in `bases`, 
+                            computed from the returned documents, much cheaper than with_highlight. 
+                            defaults to False (optional)
+        :param snippet_window: with with_positions, includes the part of `bases` around 
+                            each position, with this many bases on each side. defaults to 0 (optional)
 
         Returns:
             SearchRequestResult: dict, containing the total matches, current page number, 
-                                    and a list of documents
+                                    whether the search timed out and a list of documents
         '''
         if not index:
             index = self.index_name
         start = page * size
 
-        if fields:
-            # filtering any values that are not existing properties of the index document
-            fields = list(filter(lambda it: it in [
-                          'bases', 'name', 'creator.handle', 'creator.name', 'creator.id'], fields))
-        if not fields:
-            fields = ['bases']
-
         if return_fields:
             # filtering any values that are not existing properties of the index document
             return_fields = list(
                 filter(
-                    lambda it: it in ['bases', 'name', 'createdAt', 'creator'],
+                    lambda it: it in [
+                        'bases', 'name', 'createdAt', 'creator', 'bases_length', 'gc_content'],
                     return_fields
                 )
             )
 
         highlight = {'fields': {'bases': {}}} if with_highlight else None
 
-        resp: ObjectApiResponse = await self._client.search(
+        client, search_timeout = self._with_timeout(timeout)
+
+        resp: ObjectApiResponse = await client.search(
             index=index,
+            timeout=search_timeout,
             source=True,
-            query={"query_string": {'query': f'*{text}*', 'fields': fields}},
+            query=self._build_text_query(text, fields),
             from_=start,
             size=size,
             highlight=highlight,
             fields=return_fields
         )
 
+        pattern = compile_match_pattern(text) if with_positions and text else None
         hits: IndexDocWithHighlight = []
         for hit in resp['hits']['hits']:
             doc = hit['_source']
             doc['id'] = hit['_id']
             if hit.get('highlight'):
                 doc['highlight'] = hit['highlight']
+            if with_positions:
+                bases = doc.get('bases') or ''
+                positions = find_match_positions(bases, pattern, len(text)) if pattern else []
+                doc['positions'] = positions
+                if snippet_window > 0:
+                    doc['snippets'] = get_snippets(bases, positions, snippet_window)
             hits.append(doc)
         return {
             'total': resp['hits']['total']['value'],
             'page': page,
+            'timed_out': resp['timed_out'],
             'hits': hits
         }
 
+    async def aggregate_index(
+        self,
+        text: str = None,
+        index: str = None,
+        fields: List[str] = None,
+        creators_size: int = 10,
+        date_interval: str = 'month',
+        length_interval: int = 1000,
+        gc_interval: float = 0.05,
+        timeout: float = None
+    ) -> AggregationResult:
+        '''
+        Async aggregate the documents matching the given text, without fetching them
+
+        Runs the search with `size=0` and returns only bucket counts: documents per creator,
+        per `createdAt` interval, per `bases_length` and per `gc_content` range.
+
+        :param text: search text for query, aggregates all documents if not set (optional)
+        :param index: name of the index to aggregate (optional)
+        :param fields: fields to search the text in, defaults to ['bases'] (optional)
+        :param creators_size: number of creators to return, most documents first (optional)
+        :param date_interval: calendar interval of the `createdAt` buckets, 
+                            ex: 'day', 'week', 'month', 'year', defaults to 'month' (optional)
+        :param length_interval: width of the `bases_length` buckets, defaults to 1000 (optional)
+        :param gc_interval: width of the `gc_content` buckets, defaults to 0.05 (optional)
+        :param timeout: deadline in seconds, used as the request timeout, part of it is sent 
+                            as the ES search `timeout`, see `_with_timeout` (optional)
+
+        Returns:
+            AggregationResult: dict, containing the total matches, whether the search timed out 
+                                and the buckets of each aggregation
+        '''
+        if not index:
+            index = self.index_name
+        query = self._build_text_query(text, fields) if text else {'match_all': {}}
+        client, search_timeout = self._with_timeout(timeout)
+
+        resp: ObjectApiResponse = await client.search(
+            index=index,
+            timeout=search_timeout,
+            query=query,
+            size=0,
+            aggregations={
+                'creators': {'terms': {'field': 'creator.id', 'size': creators_size}},
+                'created_at': {
+                    'date_histogram': {'field': 'createdAt', 'calendar_interval': date_interval}
+                },
+                'bases_length': {
+                    'histogram': {'field': 'bases_length', 'interval': length_interval}
+                },
+                'gc_content': {'histogram': {'field': 'gc_content', 'interval': gc_interval}},
+            }
+        )
+
+        aggregations = resp['aggregations']
+        return {
+            'total': resp['hits']['total']['value'],
+            'timed_out': resp['timed_out'],
+            'creators': [
+                {'key': bucket['key'], 'count': bucket['doc_count']}
+                for bucket in aggregations['creators']['buckets']
+            ],
+            'created_at': [
+                {'key': bucket['key_as_string'], 'count': bucket['doc_count']}
+                for bucket in aggregations['created_at']['buckets']
+            ],
+            'bases_length': [
+                {'key': bucket['key'], 'count': bucket['doc_count']}
+                for bucket in aggregations['bases_length']['buckets']
+            ],
+            'gc_content': [
+                {'key': round(bucket['key'], 4), 'count': bucket['doc_count']}
+                for bucket in aggregations['gc_content']['buckets']
+            ],
+        }
+
     async def get_doc_by_id(self, _id: str, index: str = None) -> SearchHit:
         '''
         Async get a document by ID
@@ -1,4 +1,4 @@
-from typing import List, Optional, TypedDict
+from typing import List, Optional, TypedDict, Union
 
 
 class CreatorObj(TypedDict):
@@ -10,11 +10,15 @@ class IndexDoc(TypedDict):
     id: str
     name: str
     bases: str
+    bases_length: int
+    gc_content: float
     createdAt: str
     creator: CreatorObj
 
 class IndexDocWithHighlight(IndexDoc):
     highlight: Optional[TypedDict('Highlight', { 'bases': List[str]})]
+    positions: Optional[List[List[int]]]
+    snippets: Optional[List[str]]
 
 class SearchHit(TypedDict):
     _id: str
@@ -24,8 +28,21 @@ class SearchHit(TypedDict):
 class SearchRequestResult(TypedDict):
     total: int
     page: int
+    timed_out: bool
     hits: List[IndexDocWithHighlight]
 
+class Bucket(TypedDict):
+    key: Union[str, int, float]
+    count: int
+
+class AggregationResult(TypedDict):
+    total: int
+    timed_out: bool
+    creators: List[Bucket]
+    created_at: List[Bucket]
+    bases_length: List[Bucket]
+    gc_content: List[Bucket]
+
 class TotalDict(TypedDict):
     total: int
     relation: str
@@ -4,6 +4,12 @@ default_mapping = {
             'type': 'text',
             'search_analyzer': 'ngram_search_analyzer'
         },
+        'bases_length': {
+            'type': 'integer'
+        },
+        'gc_content': {
+            'type': 'float'
+        },
         'name': {
             'type': 'text'
         },
@@ -2,17 +2,83 @@
 import glob
 import json
 import os
+import re
+from typing import Iterator, Union
 from uuid import uuid4
 
+from .file_readers import get_raw_reader, get_reader
+
+# pieces of the top level members of a raw JSON document, see `scan_raw_members`
+_STRING = rb'"[^"\\]*(?:\\.[^"\\]*)*"'
+_OBJECT_START_RE = re.compile(rb'\s*\{\s*')
+_KEY_RE = re.compile(rb'("[^"\\]*")\s*:\s*')
+_NESTED_VALUE_RE = re.compile(
+    rb'\{(?:[^{}"]|' + _STRING + rb')*\}|\[(?:[^\[\]{}"]|' + _STRING + rb')*\]')
+_SCALAR_VALUE_RE = re.compile(rb'[^,{}\[\]"\s]+')
+_SEPARATOR_RE = re.compile(rb'\s*([,}])\s*')
+_STATS_KEYS = (b'"bases_length"', b'"gc_content"')
+_BASES_MEMBER_RE = re.compile(rb'"bases"\s*:\s*"')
+_GC_BITS = bytes(1 if byte in b'gGcC' else 0 for byte in range(256))
+# reused by the raw paths, `json.dumps` with arguments builds a new encoder on every call
+_DECODER = json.JSONDecoder()
+_COMPACT_ENCODER = json.JSONEncoder(separators=(',', ':'))
+
+def get_sequence_stats(bases: str) -> dict:
+    '''
+    Computes the precomputed sequence fields indexed with each document
+
+    Returns:
+        dict:
+            bases_length: number of bases
+            gc_content: share of G and C bases, between 0 and 1
+    '''
+    length = len(bases)
+    if not length:
+        return {'bases_length': 0, 'gc_content': 0.0}
+    lower = bases.lower()
+    gc_count = lower.count('g') + lower.count('c')
+    return {'bases_length': length, 'gc_content': round(gc_count / length, 4)}
+
+def get_raw_sequence_stats(bases: bytes) -> dict:
+    '''
+    `get_sequence_stats` of ASCII bases, counted on the bytes without decoding them
+    '''
+    length = len(bases)
+    if not length:
+        return {'bases_length': 0, 'gc_content': 0.0}
+    # G and C bases are mapped to a 1 bit and the others to 0, then counted with a popcount,
+    # branch free unlike `bytes.count`/`translate` on the dense G and C bases
+    gc_count = int.from_bytes(bases.translate(_GC_BITS), 'little').bit_count()
+    return {'bases_length': length, 'gc_content': round(gc_count / length, 4)}
+
+def add_sequence_stats(doc: dict) -> dict:
+    '''
+    Adds `bases_length` and `gc_content` to a document that has `bases`
+    '''
+    if isinstance(doc.get('bases'), str):
+        doc.update(get_sequence_stats(doc['bases']))
+    return doc
+
+def get_data_files(files_dir: str) -> list[str]:
+    '''
+    Returns the paths of all files in a directory that have a registered reader
+
+    :param files_dir: path to the directory of the data files
+    '''
+    file_list = glob.glob(os.path.join(files_dir, '*'))
+    return [path for path in file_list if os.path.isfile(path) and get_reader(path)]
 
 def get_bulk_json_data_generator(files_dir: str) -> tuple:
     '''
-    Generator function that yields the 'id' and data from each .json file in a directory.
+    Generator function that yields the 'id' and data from each document in a directory.
 
-    For each file in the directory, extracts the 'id' field from JSON data, if an 'id' field does not exist,
-    a new UUID is generated as the ID.
+    Files are read with the reader registered for their extension (see `file_readers`),
+    supporting single document and array .json files, NDJSON and FASTA/FASTQ, optionally
+    gzip or zstd compressed. Documents are streamed one at a time.
+    For each document, extracts the 'id' field from JSON data, if an 'id' field does not exist,
+    a new UUID is generated as the ID. `bases_length` and `gc_content` are added to the data.
 
-    :param files_dir: path to the directory of the .json files
+    :param files_dir: path to the directory of the data files
 
     Yields:
         tuple:
@@ -20,24 +86,23 @@ def get_bulk_json_data_generator(files_dir: str) -> tuple:
             JSON data
     '''
 
-    file_list = glob.glob(os.path.join(files_dir, '*.json'))
-    for filename in file_list:
-        with open(filename, 'r') as f:
-            data = json.load(f) 
+    for filename in get_data_files(files_dir):
+        reader = get_reader(filename)
+        for data in reader(filename):
             _id = data.pop('id', None)
             if not _id:
                 _id = uuid4()
-            yield _id, data
+            yield _id, add_sequence_stats(data)
 
 def actions_list_gen(files_dir: str, index: str, chunk_size: int) -> tuple[list[dict], int]:
     '''
     Generator produces chunks of action lists for bulk processing
     
-    This function reads JSON data from the directory, creates actions for each piece 
+    This function reads the documents from the directory, creates actions for each piece 
     of data. Each action consists of an index action followed by the corresponding document data 
     and groups these actions into chunks of a specified size.
 
-    :param files_dir: path to the directory pf the .json files
+    :param files_dir: path to the directory of the data files
     :param index: es index name for action meta-data
     :param chunk_size: number of documents per chunk
 
@@ -64,3 +129,276 @@ def actions_list_gen(files_dir: str, index: str, chunk_size: int) -> tuple[list[
                 yield actions_list, count
             return
     return
+
+def _string_end(raw_doc: bytes, pos: int) -> int:
+    '''
+    Returns the index after the closing quote of the string starting at `pos`, -1 if unterminated
+
+    Quotes are found with `bytes.find`, much faster than a regex over long values (ex: `bases`)
+    '''
+    pos += 1
+    while True:
+        end = raw_doc.find(b'"', pos)
+        if end == -1:
+            return -1
+        backslashes = 0
+        while raw_doc[end - 1 - backslashes] == 0x5c:
+            backslashes += 1
+        if backslashes % 2 == 0:
+            return end + 1
+        pos = end + 1
+
+def scan_raw_members(raw_doc: bytes) -> Union[list[tuple[bytes, int, int, int]], None]:
+    '''
+    Splits a raw JSON object into its top level members without decoding it
+
+    :param raw_doc: JSON document, on a single line
+
+    Returns:
+        list of (key, member start, value start, value end) of each member,
+        None if the layout is not supported (values nested more than one level, escaped keys)
+    '''
+    start = _OBJECT_START_RE.match(raw_doc)
+    if not start:
+        return None
+    pos = start.end()
+    members = []
+    if raw_doc[pos:pos + 1] == b'}':
+        return members if not raw_doc[pos + 1:].strip() else None
+    while True:
+        key = _KEY_RE.match(raw_doc, pos)
+        if not key:
+            return None
+        value_start = key.end()
+        if raw_doc[value_start:value_start + 1] == b'"':
+            value_end = _string_end(raw_doc, value_start)
+        else:
+            value = (
+                _NESTED_VALUE_RE.match(raw_doc, value_start)
+                or _SCALAR_VALUE_RE.match(raw_doc, value_start)
+            )
+            value_end = value.end() if value else -1
+        if value_end == -1:
+            return None
+        members.append((key.group(1), pos, value_start, value_end))
+        separator = _SEPARATOR_RE.match(raw_doc, value_end)
+        if not separator:
+            return None
+        pos = separator.end()
+        if separator.group(1) == b'}':
+            return members if pos == len(raw_doc) else None
+
+def remove_raw_member(raw_doc: bytes, members: list[tuple[bytes, int, int, int]], index: int) -> bytes:
+    '''
+    Removes the member at `index` of `scan_raw_members` from a raw JSON object
+    '''
+    _, member_start, _, value_end = members[index]
+    if index + 1 < len(members):
+        return raw_doc[:member_start] + raw_doc[members[index + 1][1]:]
+    if index > 0:
+        return raw_doc[:members[index - 1][3]] + raw_doc[value_end:]
+    return raw_doc[:member_start] + raw_doc[value_end:].lstrip()
+
+def extract_raw_id(
+    raw_doc: bytes,
+    members: list[tuple[bytes, int, int, int]] = None
+) -> tuple[Union[str, None], bytes]:
+    '''
+    Removes the top level 'id' field from a raw JSON document
+
+    The 'id' member is cut out of the bytes without decoding the document, only documents
+    with a non string 'id' or an unsupported layout (see `scan_raw_members`) are decoded
+    and serialized again.
+
+    :param raw_doc: JSON document, on a single line
+    :param members: `scan_raw_members` of the document, if already scanned (optional)
+
+    Returns:
+        tuple:
+            the 'id' value, None if the document has no 'id'
+            JSON document without the 'id' field
+    '''
+    if members is None:
+        members = scan_raw_members(raw_doc)
+    if members is not None:
+        for index, (key, _, value_start, value_end) in enumerate(members):
+            if key != b'"id"':
+                continue
+            value = raw_doc[value_start:value_end]
+            if value[:1] != b'"':
+                break
+            return json.loads(value), remove_raw_member(raw_doc, members, index)
+        else:
+            return None, raw_doc
+    doc = json.loads(raw_doc)
+    _id = doc.pop('id', None)
+    return _id, json.dumps(doc, separators=(',', ':')).encode('utf-8')
+
+def _raw_stats_members(raw_doc: bytes, members: list[tuple[bytes, int, int, int]]) -> Union[bytes, None]:
+    '''
+    Returns the `bases_length` and `gc_content` members to add to a raw JSON document,
+    b'' if it has no string `bases`, None if the document must be decoded instead
+    '''
+    bases = None
+    for key, _, value_start, value_end in members:
+        if key in _STATS_KEYS:
+            return None
+        if key == b'"bases"':
+            bases = raw_doc[value_start:value_end]
+    if bases is None or bases[:1] != b'"':
+        return b''
+    bases = bases[1:-1]
+    if b'\\' in bases or not bases.isascii():
+        return None
+    stats = get_raw_sequence_stats(bases)
+    return b'"bases_length":%d,"gc_content":%s,' % (
+        stats['bases_length'], repr(stats['gc_content']).encode('utf-8'))
+
+def _prepend_raw_members(raw_doc: bytes, raw_members: bytes) -> bytes:
+    if not raw_members:
+        return raw_doc
+    return b'{' + raw_members + raw_doc[raw_doc.index(b'{') + 1:].lstrip()
+
+def add_raw_sequence_stats(raw_doc: bytes) -> bytes:
+    '''
+    Adds `bases_length` and `gc_content` to a raw JSON document without decoding it
+
+    The stats are computed from the top level `bases` (see `scan_raw_members`) and spliced
+    at the start of the document. Documents with an unsupported layout, escape sequences or
+    non ASCII characters in `bases`, or that already have one of the stats fields,
+    are decoded instead.
+    '''
+    members = scan_raw_members(raw_doc)
+    stats = _raw_stats_members(raw_doc, members) if members is not None else None
+    if stats is None:
+        doc = add_sequence_stats(json.loads(raw_doc))
+        return json.dumps(doc, separators=(',', ':')).encode('utf-8')
+    return _prepend_raw_members(raw_doc, stats)
+
+def _prepare_common_raw_document(raw_doc: bytes) -> Union[tuple[Union[str, None], bytes], None]:
+    '''
+    Fast path of `prepare_raw_document` for documents with a plain top level `bases` string
+
+    The `bases` value is located with `bytes.find` and left out, only the rest of the document
+    (a few hundred bytes) is decoded to read the 'id' and checked: the cut `bases` must be
+    its top level member, and the stats fields must not be set already.
+
+    Returns None when the document must go through the general path
+    '''
+    key = raw_doc.find(b'"bases"')
+    if key == -1 or not raw_doc.isascii():
+        return None
+    match = _BASES_MEMBER_RE.match(raw_doc, key)
+    if not match:
+        return None
+    value_start = match.end()
+    value_end = raw_doc.find(b'"', value_start)
+    if value_end == -1 or raw_doc.find(b'\\', value_start, value_end) != -1:
+        return None
+    rest = raw_doc[:value_start] + raw_doc[value_end:]
+    if rest.count(b'"bases"') != 1:
+        return None
+    try:
+        doc = _DECODER.decode(rest.decode('ascii'))
+    except ValueError:
+        return None
+    if not isinstance(doc, dict) or doc.get('bases') != '' or 'bases_length' in doc or 'gc_content' in doc:
+        return None
+    _id = doc.pop('id', None)
+    del doc['bases']
+    bases = raw_doc[value_start:value_end]
+    stats = get_raw_sequence_stats(bases)
+    head = _COMPACT_ENCODER.encode(doc).encode('utf-8')[:-1]
+    return _id, b'%s%s"bases_length":%d,"gc_content":%s,"bases":"%s"}' % (
+        head, b',' if doc else b'', stats['bases_length'],
+        repr(stats['gc_content']).encode('utf-8'), bases)
+
+def prepare_raw_document(raw_doc: bytes) -> tuple[Union[str, None], bytes]:
+    '''
+    `extract_raw_id` and `add_raw_sequence_stats` of a raw JSON document
+
+    Documents with a plain top level `bases` string (the common layout) only have the rest
+    of the document decoded, see `_prepare_common_raw_document`, other documents
+    are scanned once with `scan_raw_members`.
+
+    Returns:
+        tuple:
+            the 'id' value, None if the document has no 'id'
+            JSON document without the 'id' field, with `bases_length` and `gc_content`
+    '''
+    prepared = _prepare_common_raw_document(raw_doc)
+    if prepared is not None:
+        return prepared
+    members = scan_raw_members(raw_doc)
+    stats = _raw_stats_members(raw_doc, members) if members is not None else None
+    if stats is None:
+        doc = add_sequence_stats(json.loads(raw_doc))
+        _id = doc.pop('id', None)
+        return _id, json.dumps(doc, separators=(',', ':')).encode('utf-8')
+    _id, raw_doc = extract_raw_id(raw_doc, members)
+    return _id, _prepend_raw_members(raw_doc, stats)
+
+def _read_raw_documents(filename: str) -> Iterator[tuple[Union[str, None], bytes]]:
+    raw_reader = get_raw_reader(filename)
+    if raw_reader:
+        for raw_doc in raw_reader(filename):
+            yield prepare_raw_document(raw_doc)
+    else:
+        for doc in get_reader(filename)(filename):
+            _id = doc.pop('id', None)
+            doc = add_sequence_stats(doc)
+            yield _id, json.dumps(doc, separators=(',', ':')).encode('utf-8')
+
+def get_bulk_raw_data_generator(files_dir: str) -> Iterator[tuple[str, bytes]]:
+    '''
+    Generator function that yields the 'id' and raw JSON bytes of each document in a directory.
+
+    Formats with a raw reader (JSON, NDJSON) are not decoded, other formats are read
+    with their document reader and serialized.
+    If the document does not have an 'id' field, a new UUID is generated as the ID.
+    `bases_length` and `gc_content` are added to the documents.
+
+    :param files_dir: path to the directory of the data files
+
+    Yields:
+        tuple:
+            id from the document or a newly generated UUID if 'id' is not present.
+            JSON document bytes, without the 'id' field
+    '''
+    for filename in get_data_files(files_dir):
+        for _id, raw_doc in _read_raw_documents(filename):
+            yield _id or str(uuid4()), raw_doc
+
+def bulk_body_gen(files_dir: str, index: str, chunk_size: int) -> Iterator[tuple[bytes, int]]:
+    '''
+    Generator produces chunks of pre-serialized NDJSON bodies for the `_bulk` API
+
+    Fast path of `actions_list_gen`: the index action line and the raw document bytes
+    are appended to a reused buffer, skipping the dict round trip through the ES client
+    serializer.
+
+    :param files_dir: path to the directory of the data files
+    :param index: es index name for action meta-data
+    :param chunk_size: number of documents per chunk
+
+    Yields:
+        tuple:
+            NDJSON bulk request body
+            count of documents in the current chunk
+    '''
+    action_prefix = b'{"index":{"_index":' + json.dumps(index).encode('utf-8') + b',"_id":'
+    body = bytearray()
+    count = 0
+    for _id, raw_doc in get_bulk_raw_data_generator(files_dir):
+        body += action_prefix
+        body += _COMPACT_ENCODER.encode(str(_id)).encode('utf-8')
+        body += b'}}\n'
+        body += raw_doc
+        body += b'\n'
+        count += 1
+        if count == chunk_size:
+            yield bytes(body), count
+            body.clear()
+            count = 0
+    if count:
+        yield bytes(body), count
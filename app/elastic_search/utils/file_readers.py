@@ -0,0 +1,280 @@
+import gzip
+import io
+import json
+import os
+from typing import Callable, Iterator
+
+# Size of the buffered reads used by every reader, keeps memory per file constant
+READ_BUFFER_SIZE = 1024 * 1024
+# a decoding error this close to the end of the buffer can be a value cut by the read
+# (ex: 'fals' of 'false', '-Infinit' of '-Infinity')
+_TRUNCATED_VALUE_MARGIN = 16
+
+DocReader = Callable[[str], Iterator[dict]]
+RawDocReader = Callable[[str], Iterator[bytes]]
+
+_readers: dict[str, DocReader] = {}
+_raw_readers: dict[str, RawDocReader] = {}
+
+
+def register_reader(extensions: list[str], reader: DocReader) -> None:
+    '''
+    Registers a reader for one or more file extensions
+
+    A reader takes a file path and yields one document (dict) at a time.
+    Compression suffixes (`.gz`, `.zst`) are handled by `open_text` and should not be
+    part of the registered extensions.
+
+    :param extensions: file extensions including the leading dot, ex: ['.ndjson']
+    :param reader: generator function yielding documents from a file
+    '''
+    for ext in extensions:
+        _readers[ext.lower()] = reader
+
+
+def register_raw_reader(extensions: list[str], reader: RawDocReader) -> None:
+    '''
+    Registers a raw reader for one or more file extensions
+
+    A raw reader yields each document as the JSON bytes of a single line (no raw newlines),
+    letting the bulk fast path splice documents into the request body without parsing them.
+
+    :param extensions: file extensions including the leading dot, ex: ['.ndjson']
+    :param reader: generator function yielding single line JSON documents from a file
+    '''
+    for ext in extensions:
+        _raw_readers[ext.lower()] = reader
+
+
+def split_extension(filename: str) -> tuple[str, str]:
+    '''
+    Splits a file name into its format extension and compression extension
+
+    ex: 'seqs.ndjson.gz' -> ('.ndjson', '.gz'), 'seq.json' -> ('.json', '')
+    '''
+    root, ext = os.path.splitext(filename.lower())
+    compression = ''
+    if ext in ('.gz', '.zst'):
+        compression = ext
+        root, ext = os.path.splitext(root)
+    return ext, compression
+
+
+def get_reader(filename: str) -> DocReader:
+    '''
+    Returns the registered reader for a file, or None if the format is not supported
+    '''
+    ext, _ = split_extension(filename)
+    return _readers.get(ext)
+
+
+def get_raw_reader(filename: str) -> RawDocReader:
+    '''
+    Returns the registered raw reader for a file, or None if its documents must be parsed
+    '''
+    ext, _ = split_extension(filename)
+    return _raw_readers.get(ext)
+
+
+def open_binary(path: str) -> io.BufferedIOBase:
+    '''
+    Opens a file for buffered binary reading, transparently decompressing `.gz` and `.zst` files
+
+    Zstandard support requires the optional `zstandard` package.
+    '''
+    _, compression = split_extension(path)
+    if compression == '.gz':
+        return io.BufferedReader(gzip.open(path, 'rb'), buffer_size=READ_BUFFER_SIZE)
+    if compression == '.zst':
+        try:
+            import zstandard
+        except ImportError as err:
+            raise ImportError(
+                'Reading .zst files requires the `zstandard` package: pip3 install zstandard'
+            ) from err
+        raw = open(path, 'rb')
+        return io.BufferedReader(
+            zstandard.ZstdDecompressor().stream_reader(raw, closefd=True),
+            buffer_size=READ_BUFFER_SIZE
+        )
+    return open(path, 'rb', buffering=READ_BUFFER_SIZE)
+
+
+def open_text(path: str) -> io.TextIOWrapper:
+    '''
+    Opens a (possibly compressed) file for buffered, line by line text reading
+    '''
+    return io.TextIOWrapper(open_binary(path), encoding='utf-8')
+
+
+def _check_document(doc: object, location: str) -> dict:
+    if not isinstance(doc, dict):
+        raise ValueError(f'{location} is not a JSON object')
+    return doc
+
+
+def read_json(path: str) -> Iterator[dict]:
+    '''
+    Reads a .json file holding either a single document or an array of documents
+
+    Arrays are decoded incrementally, one document at a time, so the whole file is never
+    held in memory.
+    '''
+    with open_text(path) as f:
+        head = f.read(READ_BUFFER_SIZE)
+        stripped = head.lstrip()
+        if not stripped.startswith('['):
+            yield _check_document(json.loads(head + f.read()), path)
+            return
+        yield from _iter_json_array(f, stripped[1:], path)
+
+
+def _iter_json_array(f: io.TextIOWrapper, buffer: str, path: str) -> Iterator[dict]:
+    decoder = json.JSONDecoder()
+    pos = 0
+    eof = False
+    count = 0
+    # documents are separated by exactly one comma
+    expect_document = True
+    while True:
+        while pos < len(buffer) and buffer[pos] in ' \t\r\n':
+            pos += 1
+        if pos >= len(buffer):
+            if eof:
+                raise ValueError(f'Unterminated JSON array in {path}')
+            buffer = f.read(READ_BUFFER_SIZE)
+            pos = 0
+            eof = not buffer
+            continue
+        char = buffer[pos]
+        if not expect_document:
+            if char == ']':
+                return
+            if char != ',':
+                raise ValueError(f'Expected "," or "]" after document {count - 1} of {path}')
+            pos += 1
+            expect_document = True
+            continue
+        if char == ']' and count == 0:
+            return
+        if char in ',]':
+            raise ValueError(f'Expected document {count} of {path}, found "{char}"')
+        try:
+            doc, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError as err:
+            truncated = (
+                err.pos >= len(buffer) - _TRUNCATED_VALUE_MARGIN
+                or err.msg.startswith('Unterminated string')
+            )
+            if eof or not truncated:
+                raise
+            # the document is split across reads, keep the remainder and read more
+            chunk = f.read(READ_BUFFER_SIZE)
+            eof = not chunk
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            continue
+        yield _check_document(doc, f'Document {count} of {path}')
+        count += 1
+        pos = end
+        expect_document = False
+
+
+def read_json_raw(path: str) -> Iterator[bytes]:
+    '''
+    Reads a .json file as raw JSON bytes
+
+    A single document file is yielded as is, arrays fall back to decoding each document
+    and serializing it back.
+    '''
+    with open_binary(path) as f:
+        # peek at the buffered head, a sized `read` allocates the full buffer size for each file
+        is_array = f.peek(READ_BUFFER_SIZE).lstrip()[:1] == b'['
+        if not is_array:
+            data = f.read()
+    if is_array:
+        for doc in read_json(path):
+            yield json.dumps(doc, separators=(',', ':')).encode('utf-8')
+        return
+    data = data.strip()
+    if data[:1] != b'{':
+        raise ValueError(f'{path} is not a JSON object')
+    # raw newlines can only be whitespace between tokens in valid JSON
+    yield data.replace(b'\r', b' ').replace(b'\n', b' ')
+
+
+def read_ndjson(path: str) -> Iterator[dict]:
+    '''
+    Reads newline delimited JSON, one document per line
+    '''
+    with open_text(path) as f:
+        for number, line in enumerate(f):
+            if line.strip():
+                yield _check_document(json.loads(line), f'Line {number + 1} of {path}')
+
+
+def read_ndjson_raw(path: str) -> Iterator[bytes]:
+    '''
+    Reads newline delimited JSON as raw bytes, one document per line
+    '''
+    with open_binary(path) as f:
+        for number, line in enumerate(f):
+            line = line.strip()
+            if not line:
+                continue
+            if line[:1] != b'{':
+                raise ValueError(f'Line {number + 1} of {path} is not a JSON object')
+            yield line
+
+
+def read_fasta(path: str) -> Iterator[dict]:
+    '''
+    Reads FASTA records, mapping the header line to `name` and the
+    (possibly multi-line) sequence to `bases`
+    '''
+    with open_text(path) as f:
+        name = None
+        bases = []
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith(';'):
+                continue
+            if line.startswith('>'):
+                if name is not None:
+                    yield {'name': name, 'bases': ''.join(bases)}
+                name = line[1:].strip()
+                bases = []
+            else:
+                bases.append(line)
+        if name is not None:
+            yield {'name': name, 'bases': ''.join(bases)}
+
+
+def read_fastq(path: str) -> Iterator[dict]:
+    '''
+    Reads FASTQ records (header, sequence, separator, quality), mapping the header line
+    to `name` and the sequence to `bases`. Quality scores are not indexed.
+    '''
+    with open_text(path) as f:
+        while True:
+            header = f.readline()
+            if not header:
+                return
+            header = header.strip()
+            if not header:
+                continue
+            if not header.startswith('@'):
+                raise ValueError(f'Invalid FASTQ record header in {path}: {header[:50]}')
+            bases = f.readline().strip()
+            f.readline()  # '+' separator
+            f.readline()  # quality
+            yield {'name': header[1:].strip(), 'bases': bases}
+
+
+register_reader(['.json'], read_json)
+register_reader(['.ndjson', '.jsonl'], read_ndjson)
+register_reader(['.fasta', '.fa', '.fna', '.fas'], read_fasta)
+register_reader(['.fastq', '.fq'], read_fastq)
+
+register_raw_reader(['.json'], read_json_raw)
+register_raw_reader(['.ndjson', '.jsonl'], read_ndjson_raw)
@@ -11,6 +11,7 @@ class ESConfig(TypedDict):
     connection_url: str
     es_index_name: str
     data_files_dir_path: str
+    snapshot_path: str
 
 def get_es_client_config() -> ESConfig:
     '''
@@ -36,12 +37,82 @@ def get_es_client_config() -> ESConfig:
         connection_url = es_url
         es_index_name = config.get('index-config', 'es_index_name')
         data_files_dir_path = config.get('initial-data', 'data_files_dir_name')
+        snapshot_file_name = config.get('initial-data', 'snapshot_file_name', fallback='')
 
         return {
             'connection_url': connection_url,
             'es_index_name': es_index_name,
-            'data_files_dir_path': get_project_root().as_posix() + data_files_dir_path
+            'data_files_dir_path': get_project_root().as_posix() + data_files_dir_path,
+            'snapshot_path': (
+                get_project_root().as_posix() + snapshot_file_name if snapshot_file_name else ''
+            )
         }
     except configparser.NoOptionError as err:
         print('[ERROR] configparser.NoOptionError: ', err)
         raise configparser.NoOptionError(err.section, err.option)
+
+
+class ServiceConfig(TypedDict):
+    workers: int
+    cache_backend: str
+    cache_dir: str
+    cache_ttl: int
+    leader_lock_path: str
+    drain_timeout: float
+
+def get_service_config() -> ServiceConfig:
+    '''
+    Reads the search service deployment configuration from config.ini file
+
+    Every worker reads the same file, environment variables override the file values
+    so replicas can be tuned without editing it:
+    WEB_CONCURRENCY, CACHE_BACKEND, CACHE_DIR, CACHE_TTL, LEADER_LOCK_PATH, DRAIN_TIMEOUT
+    :return: dictionary for the service configuration details
+    '''
+    config = configparser.ConfigParser()
+    config_file = get_project_root().as_posix() + '/elastic_search/config/config.ini'
+    config.read(config_file)
+
+    def _get(env_name: str, option: str, fallback: str) -> str:
+        return os.environ.get(env_name) or config.get('service', option, fallback=fallback)
+
+    return {
+        'workers': int(_get('WEB_CONCURRENCY', 'workers', '1')),
+        'cache_backend': _get('CACHE_BACKEND', 'cache_backend', 'memory'),
+        'cache_dir': _get('CACHE_DIR', 'cache_dir', '/tmp/dna_sequence_service/cache'),
+        'cache_ttl': int(_get('CACHE_TTL', 'cache_ttl', '60')),
+        'leader_lock_path': _get(
+            'LEADER_LOCK_PATH', 'leader_lock_path', '/tmp/dna_sequence_service/leader.lock'),
+        'drain_timeout': float(_get('DRAIN_TIMEOUT', 'drain_timeout', '10')),
+    }
+
+
+class SearchLimitsConfig(TypedDict):
+    max_concurrency: int
+    max_queue: int
+    queue_timeout: float
+    retry_after: int
+    max_size: int
+    max_page_depth: int
+    max_snippet_window: int
+    search_timeout: float
+
+def get_search_limits_config() -> SearchLimitsConfig:
+    '''
+    Reads the search admission control limits from config.ini file
+    :return: dictionary for the search limits, per worker
+    '''
+    config = configparser.ConfigParser()
+    config_file = get_project_root().as_posix() + '/elastic_search/config/config.ini'
+    config.read(config_file)
+
+    return {
+        'max_concurrency': config.getint('search-limits', 'max_concurrency', fallback=32),
+        'max_queue': config.getint('search-limits', 'max_queue', fallback=128),
+        'queue_timeout': config.getfloat('search-limits', 'queue_timeout', fallback=1.0),
+        'retry_after': config.getint('search-limits', 'retry_after', fallback=1),
+        'max_size': config.getint('search-limits', 'max_size', fallback=100),
+        'max_page_depth': config.getint('search-limits', 'max_page_depth', fallback=10000),
+        'max_snippet_window': config.getint('search-limits', 'max_snippet_window', fallback=200),
+        'search_timeout': config.getfloat('search-limits', 'search_timeout', fallback=5.0),
+    }
@@ -0,0 +1,42 @@
+import re
+from typing import List
+
+# positions returned per document, ambiguous queries (ex: 'a') can match thousands of times
+MAX_POSITIONS = 100
+
+
+def compile_match_pattern(text: str) -> re.Pattern:
+    '''
+    Compiles the case-insensitive pattern finding every, possibly overlapping, occurrence of text
+    '''
+    return re.compile(f'(?={re.escape(text)})', re.IGNORECASE)
+
+
+def find_match_positions(
+    bases: str,
+    pattern: re.Pattern,
+    text_length: int,
+    max_positions: int = MAX_POSITIONS
+) -> List[List[int]]:
+    '''
+    Returns the [start, end] offsets of the occurrences of the search text in bases
+
+    :param bases: sequence of the document
+    :param pattern: pattern from `compile_match_pattern`
+    :param text_length: length of the search text
+    :param max_positions: maximum number of positions returned (optional)
+    '''
+    positions = []
+    for match in pattern.finditer(bases):
+        if len(positions) == max_positions:
+            break
+        start = match.start()
+        positions.append([start, start + text_length])
+    return positions
+
+
+def get_snippets(bases: str, positions: List[List[int]], window: int) -> List[str]:
+    '''
+    Returns the part of bases around each position, with `window` bases on each side
+    '''
+    return [bases[max(start - window, 0):end + window] for start, end in positions]
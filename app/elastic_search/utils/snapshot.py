@@ -0,0 +1,425 @@
+import mmap
+import os
+import re
+import struct
+import sys
+import zlib
+from array import array
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from itertools import product
+from typing import Iterable, Iterator, Union
+
+MAGIC = b'DNASNAP1'
+VERSION = 1
+
+SECTIONS = [
+    'id_offsets', 'ids',
+    'name_offsets', 'names',
+    'creator_offsets', 'creator_ids',
+    'created_at',
+    'bases_offsets', 'bases_lengths', 'bases_encodings', 'bases',
+    'patch_offsets', 'patches',
+    'id_order',
+]
+# magic, version, count, then (offset, length) of each section, then crc32 of the sections
+_HEADER = struct.Struct('<8sIQ' + 'QQ' * len(SECTIONS) + 'I')
+_ALIGNMENT = 8
+# array type of the sections that are not byte strings
+_SECTION_FORMATS = {
+    'id_offsets': 'Q', 'name_offsets': 'Q', 'creator_offsets': 'Q',
+    'created_at': 'q', 'bases_offsets': 'Q', 'bases_lengths': 'Q',
+    'patch_offsets': 'Q', 'id_order': 'I',
+}
+
+# createdAt of documents without one
+MISSING_CREATED_AT = -(2 ** 63)
+
+# bases encodings: 2-bit packed (4 bases per byte) with patches for upper case runs and
+# non a/c/g/t characters, or UTF-8 when the patches would be larger than the sequence
+ENCODING_RAW = 0
+ENCODING_2BIT = 1
+
+_TO_BASE4 = str.maketrans('acgt', '0123')
+_UNPACK = [''.join(bases) for bases in product('acgt', repeat=4)]
+_UPPER_RUN_RE = re.compile('[A-Z]+')
+_NOT_ACGT_RE = re.compile('[^acgt]')
+
+
+def pack_bases(bases: str) -> tuple[int, bytes, bytes]:
+    '''
+    Encodes a sequence, see `ENCODING_2BIT` and `ENCODING_RAW`
+
+    Returns:
+        tuple:
+            encoding of the sequence
+            encoded bytes
+            patches (uint32 array: count of upper case runs, (start, end) of each run,
+                count of other characters, (position, code point) of each character)
+    '''
+    lower = bases.lower()
+    if not bases.isascii() or len(lower) != len(bases):
+        return ENCODING_RAW, bases.encode('utf-8'), b''
+    runs = [offset for run in _UPPER_RUN_RE.finditer(bases) for offset in run.span()]
+    others = [
+        value for match in _NOT_ACGT_RE.finditer(lower)
+        for value in (match.start(), ord(match.group()))
+    ]
+    if 4 * (2 + len(runs) + len(others)) + len(bases) // 4 >= len(bases):
+        return ENCODING_RAW, bases.encode('utf-8'), b''
+    if others:
+        lower = _NOT_ACGT_RE.sub('a', lower)
+    digits = lower.translate(_TO_BASE4)
+    digits += '0' * (-len(digits) % 4)
+    packed = int(digits, 4).to_bytes(len(digits) // 4, 'big') if digits else b''
+    patches = array('I', [len(runs) // 2, *runs, len(others) // 2, *others])
+    return ENCODING_2BIT, packed, patches.tobytes()
+
+
+def unpack_bases(encoding: int, data: bytes, length: int, patches: bytes) -> str:
+    '''
+    Decodes a sequence encoded by `pack_bases`
+    '''
+    if encoding == ENCODING_RAW:
+        return bytes(data).decode('utf-8')
+    bases = ''.join(map(_UNPACK.__getitem__, data))[:length]
+    patches = array('I', bytes(patches))
+    runs_count = patches[0]
+    runs = patches[1:1 + 2 * runs_count]
+    others = patches[2 + 2 * runs_count:]
+    if others:
+        chars = list(bases)
+        for i in range(0, len(others), 2):
+            chars[others[i]] = chr(others[i + 1])
+        bases = ''.join(chars)
+    if runs:
+        pieces = []
+        previous_end = 0
+        for i in range(0, len(runs), 2):
+            start, end = runs[i], runs[i + 1]
+            pieces.append(bases[previous_end:start])
+            pieces.append(bases[start:end].upper())
+            previous_end = end
+        pieces.append(bases[previous_end:])
+        bases = ''.join(pieces)
+    return bases
+
+
+def _to_epoch(created_at: Union[str, int, float, None]) -> int:
+    '''
+    Returns `createdAt` in epoch microseconds, MISSING_CREATED_AT if it is not set or invalid
+
+    Like the ES `date` default format, numbers (and strings of digits) are epoch milliseconds
+    '''
+    if created_at is None or created_at == '' or isinstance(created_at, bool):
+        return MISSING_CREATED_AT
+    if isinstance(created_at, (int, float)):
+        return int(created_at * 1000)
+    if not isinstance(created_at, str):
+        return MISSING_CREATED_AT
+    if created_at.lstrip('-').isdigit():
+        return int(created_at) * 1000
+    try:
+        created = datetime.fromisoformat(created_at)
+    except ValueError:
+        return MISSING_CREATED_AT
+    if created.tzinfo is None:
+        created = created.replace(tzinfo=timezone.utc)
+    delta = created - datetime(1970, 1, 1, tzinfo=timezone.utc)
+    return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+
+def _from_epoch(epoch_us: int) -> Union[str, None]:
+    if epoch_us == MISSING_CREATED_AT:
+        return None
+    seconds, micros = divmod(epoch_us, 1000000)
+    return datetime.fromtimestamp(seconds, tz=timezone.utc).replace(microsecond=micros).isoformat()
+
+
+class SnapshotWriter:
+    '''
+    Accumulates documents in a compact columnar layout and writes them as a snapshot file
+
+    Layout: a header (magic, version, document count, offset and length of each section,
+    crc32 of the sections) followed by 8-byte aligned sections. Strings are stored as a blob
+    with a uint64 offset table, `createdAt` as int64 epoch microseconds, bases 2-bit packed with
+    an offset table, and `id_order` holds the rows sorted by id for binary search lookups.
+    When an id is added more than once, the last document added is kept (as in ES).
+
+    Attributes:
+        count: number of documents added
+    '''
+
+    def __init__(self) -> None:
+        self.count = 0
+        self._ids: list[str] = []
+        self._strings = {
+            'ids': (array('Q', [0]), bytearray()),
+            'names': (array('Q', [0]), bytearray()),
+            'creator_ids': (array('Q', [0]), bytearray()),
+        }
+        self._created_at = array('q')
+        self._bases_offsets = array('Q', [0])
+        self._bases_lengths = array('Q')
+        self._bases_encodings = bytearray()
+        self._bases = bytearray()
+        self._patch_offsets = array('Q', [0])
+        self._patches = bytearray()
+
+    def _add_string(self, column: str, value: Union[str, None]) -> None:
+        offsets, blob = self._strings[column]
+        blob += (value or '').encode('utf-8')
+        offsets.append(len(blob))
+
+    def add(self, _id: str, doc: dict) -> None:
+        '''
+        Adds a document, `doc` is the document without its id (as indexed)
+        '''
+        _id = str(_id)
+        self._ids.append(_id)
+        self._add_string('ids', _id)
+        self._add_string('names', doc.get('name'))
+        self._add_string('creator_ids', (doc.get('creator') or {}).get('id'))
+        self._created_at.append(_to_epoch(doc.get('createdAt')))
+        bases = doc.get('bases') or ''
+        encoding, data, patches = pack_bases(bases)
+        self._bases += data
+        self._bases_offsets.append(len(self._bases))
+        self._bases_lengths.append(len(bases))
+        self._bases_encodings.append(encoding)
+        self._patches += patches
+        self._patch_offsets.append(len(self._patches))
+        self.count += 1
+
+    def add_all(self, docs: Iterable[tuple[str, dict]]) -> None:
+        '''
+        Adds (id, document) pairs, see `add`
+        '''
+        for _id, doc in docs:
+            self.add(_id, doc)
+
+    def _keep_rows(self, rows: list[int]) -> None:
+        '''
+        Drops every row not in `rows`
+        '''
+        def select(offsets: array, blob: bytearray) -> tuple[array, bytearray]:
+            kept_offsets, kept_blob = array('Q', [0]), bytearray()
+            for row in rows:
+                kept_blob += blob[offsets[row]:offsets[row + 1]]
+                kept_offsets.append(len(kept_blob))
+            return kept_offsets, kept_blob
+
+        for column, (offsets, blob) in self._strings.items():
+            self._strings[column] = select(offsets, blob)
+        self._bases_offsets, self._bases = select(self._bases_offsets, self._bases)
+        self._patch_offsets, self._patches = select(self._patch_offsets, self._patches)
+        self._ids = [self._ids[row] for row in rows]
+        self._created_at = array('q', [self._created_at[row] for row in rows])
+        self._bases_lengths = array('Q', [self._bases_lengths[row] for row in rows])
+        self._bases_encodings = bytearray(self._bases_encodings[row] for row in rows)
+        self.count = len(rows)
+
+    def write(self, path: str) -> None:
+        '''
+        Writes the snapshot, the file is replaced atomically
+        '''
+        last_rows = {_id: row for row, _id in enumerate(self._ids)}
+        if len(last_rows) < self.count:
+            self._keep_rows(sorted(last_rows.values()))
+        id_order = array('I', sorted(range(self.count), key=self._ids.__getitem__))
+        sections = {
+            'id_offsets': self._strings['ids'][0].tobytes(),
+            'ids': bytes(self._strings['ids'][1]),
+            'name_offsets': self._strings['names'][0].tobytes(),
+            'names': bytes(self._strings['names'][1]),
+            'creator_offsets': self._strings['creator_ids'][0].tobytes(),
+            'creator_ids': bytes(self._strings['creator_ids'][1]),
+            'created_at': self._created_at.tobytes(),
+            'bases_offsets': self._bases_offsets.tobytes(),
+            'bases_lengths': self._bases_lengths.tobytes(),
+            'bases_encodings': bytes(self._bases_encodings),
+            'bases': bytes(self._bases),
+            'patch_offsets': self._patch_offsets.tobytes(),
+            'patches': bytes(self._patches),
+            'id_order': id_order.tobytes(),
+        }
+        if sys.byteorder != 'little':
+            raise Exception('Snapshots can only be written on little-endian hosts')
+
+        table = []
+        position = _HEADER.size
+        crc = 0
+        for name in SECTIONS:
+            position += -position % _ALIGNMENT
+            table.extend([position, len(sections[name])])
+            crc = zlib.crc32(sections[name], crc)
+            position += len(sections[name])
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(_HEADER.pack(MAGIC, VERSION, self.count, *table, crc))
+            for name in SECTIONS:
+                f.write(b'\0' * (-f.tell() % _ALIGNMENT))
+                f.write(sections[name])
+        os.replace(tmp_path, path)
+
+
+class SequenceStore:
+    '''
+    Read-only, memory-mapped snapshot of the indexed documents
+
+    Opening a snapshot only reads its header, columns are read from the mapping on access,
+    so id lookups, counts and integrity checks do not touch the JSON files or ES.
+
+    Attributes:
+        path: path of the snapshot file
+        count: number of documents
+    '''
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._file = open(path, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._mmap) < _HEADER.size:
+            self.close()
+            raise Exception('Invalid snapshot file: ', path)
+        header = _HEADER.unpack_from(self._mmap)
+        magic, version, self.count = header[:3]
+        if magic != MAGIC or version != VERSION or sys.byteorder != 'little':
+            self.close()
+            raise Exception('Invalid snapshot file: ', path)
+        self._crc = header[-1]
+        table = header[3:-1]
+        if not self._valid_table(table):
+            self.close()
+            raise Exception('Invalid snapshot file: ', path)
+        self._users = 0
+        self._closing = False
+        self._view = memoryview(self._mmap)
+        self._sections = {
+            name: self._view[table[2 * i]:table[2 * i] + table[2 * i + 1]]
+            for i, name in enumerate(SECTIONS)
+        }
+        for name, fmt in _SECTION_FORMATS.items():
+            self._sections[name] = self._sections[name].cast(fmt)
+
+    def _valid_table(self, table: tuple) -> bool:
+        '''
+        Checks that every section is aligned and within the file, ex: not a truncated file, 
+        and that the columns have one value per document
+        '''
+        for i, name in enumerate(SECTIONS):
+            offset, length = table[2 * i], table[2 * i + 1]
+            if offset % _ALIGNMENT or offset < _HEADER.size or offset + length > len(self._mmap):
+                return False
+            if name in _SECTION_FORMATS:
+                itemsize = struct.calcsize(_SECTION_FORMATS[name])
+                rows = self.count + 1 if name.endswith('_offsets') else self.count
+                if length != rows * itemsize:
+                    return False
+        return table[2 * SECTIONS.index('bases_encodings') + 1] == self.count
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _string(self, offsets: str, blob: str, row: int) -> str:
+        start, end = self._sections[offsets][row], self._sections[offsets][row + 1]
+        return bytes(self._sections[blob][start:end]).decode('utf-8')
+
+    def _id(self, row: int) -> str:
+        return self._string('id_offsets', 'ids', row)
+
+    def find_row(self, _id: str) -> Union[int, None]:
+        '''
+        Binary searches the row of a document id, None if it is not in the snapshot
+        '''
+        id_order = self._sections['id_order']
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self._id(id_order[middle]) < _id:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.count and self._id(id_order[low]) == _id:
+            return id_order[low]
+        return None
+
+    def get_row(self, row: int) -> dict:
+        '''
+        Returns the document stored at a row
+        '''
+        start, end = self._sections['bases_offsets'][row], self._sections['bases_offsets'][row + 1]
+        patch_start = self._sections['patch_offsets'][row]
+        patch_end = self._sections['patch_offsets'][row + 1]
+        bases = unpack_bases(
+            self._sections['bases_encodings'][row],
+            self._sections['bases'][start:end],
+            self._sections['bases_lengths'][row],
+            self._sections['patches'][patch_start:patch_end]
+        )
+        return {
+            'id': self._id(row),
+            'name': self._string('name_offsets', 'names', row),
+            'bases': bases,
+            'createdAt': _from_epoch(self._sections['created_at'][row]),
+            'creator': {'id': self._string('creator_offsets', 'creator_ids', row)},
+        }
+
+    def get(self, _id: str) -> Union[dict, None]:
+        '''
+        Returns the document with the given id, None if it is not in the snapshot
+        '''
+        row = self.find_row(_id)
+        return self.get_row(row) if row is not None else None
+
+    def ids(self) -> Iterator[str]:
+        for row in range(self.count):
+            yield self._id(row)
+
+    def verify(self) -> bool:
+        '''
+        Checks the snapshot integrity against the checksum written with it
+        '''
+        crc = 0
+        for name in SECTIONS:
+            crc = zlib.crc32(self._sections[name], crc)
+        return crc == self._crc
+
+    @contextmanager
+    def in_use(self) -> Iterator['SequenceStore']:
+        '''
+        Keeps the snapshot open while it is read off the event loop, ex: by `verify` 
+        in a thread, a `close` meanwhile is deferred until it is no longer in use
+        '''
+        self._users += 1
+        try:
+            yield self
+        finally:
+            self._users -= 1
+            if self._closing and not self._users:
+                self.close()
+
+    def close(self) -> None:
+        '''
+        Unmaps the snapshot, once it is no longer in use (see `in_use`)
+        '''
+        if getattr(self, '_users', 0):
+            self._closing = True
+            return
+        for section in getattr(self, '_sections', {}).values():
+            section.release()
+        if getattr(self, '_view', None) is not None:
+            self._view.release()
+        self._mmap.close()
+        self._file.close()
+
+
+def open_snapshot(path: str) -> Union[SequenceStore, None]:
+    '''
+    Opens the snapshot at path, None if there is no snapshot
+    '''
+    if not path or not os.path.exists(path):
+        return None
+    return SequenceStore(path)
@@ -0,0 +1,16 @@
+# Gunicorn configuration for the multi-worker deployment mode
+# run with: gunicorn -c app/gunicorn_conf.py app.main:app
+import os
+
+from app.elastic_search.utils.get_es_config import get_service_config
+
+_service_config = get_service_config()
+
+bind = os.environ.get('BIND', '0.0.0.0:80')
+workers = _service_config['workers']
+# each worker drains its in-flight requests on shutdown (see `app.workers`),
+# gunicorn kills it after graceful_timeout, leaving room to close the ES connections
+worker_class = 'app.workers.DrainingUvicornWorker'
+graceful_timeout = int(_service_config['drain_timeout']) + 5
+timeout = 120
+keepalive = 5
@@ -0,0 +1,70 @@
+import fcntl
+import logging
+import os
+
+
+class LeaderLock:
+    '''
+    Leader election between the workers sharing a lock file
+
+    The first worker to take the exclusive lock is the leader, it keeps it until it exits
+    (the OS releases the lock if the worker dies), so only one worker initializes
+    and populates the index. Put the lock file on a shared volume to elect a single
+    leader across hosts.
+
+    Attributes:
+        _lock_path: path of the lock file
+        _fd: file descriptor holding the lock, None if not the leader
+    '''
+
+    def __init__(self, lock_path: str) -> None:
+        self._lock_path = lock_path
+        self._fd = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self._fd is not None
+
+    def try_acquire(self) -> bool:
+        '''
+        Tries to become the leader without blocking, returns True if this worker is the leader
+        '''
+        if self._fd is not None:
+            return True
+        os.makedirs(os.path.dirname(self._lock_path) or '.', exist_ok=True)
+        fd = os.open(self._lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode('utf-8'))
+        self._fd = fd
+        logging.info('[ INFO ] - Worker %s is the leader', os.getpid())
+        return True
+
+    def mark_index_updated(self) -> None:
+        '''
+        Bumps the index generation, called by the leader once it (re)populated the index
+        '''
+        os.utime(self._lock_path)
+
+    def index_generation(self) -> int:
+        '''
+        Returns the generation of the index, shared by every worker through the lock file
+
+        It changes when a worker becomes the leader (before it populates the index)
+        and when the leader marks the index as updated.
+        '''
+        try:
+            return os.stat(self._lock_path).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+    def release(self) -> None:
+        if self._fd is None:
+            return
+        fcntl.flock(self._fd, fcntl.LOCK_UN)
+        os.close(self._fd)
+        self._fd = None
@@ -1,59 +1,342 @@
+import asyncio
 import logging
-from typing import List
+import os
+from typing import Any, Awaitable, Callable, List, Union
 from time import sleep
 
 import uvicorn
+from elastic_transport import ConnectionTimeout
 from fastapi import Depends, FastAPI, Request
 from fastapi.responses import JSONResponse
+from starlette.datastructures import State
 
+from .admission import AdmissionController, AdmissionRejected, ClientDisconnected
+from .cache import create_cache, make_cache_key
 from .elastic_search.client import ElasticSearchClient
+from .elastic_search.utils.get_es_config import (get_es_client_config,
+                                                 get_search_limits_config,
+                                                 get_service_config)
+from .elastic_search.utils.snapshot import SequenceStore
+from .leader import LeaderLock
 
+DATE_INTERVALS = ['minute', 'hour', 'day', 'week', 'month', 'quarter', 'year']
+
+
+def load_snapshot(state: State) -> Union[SequenceStore, None]:
+    '''
+    Returns the snapshot of the indexed documents, None if there is none
+
+    The snapshot is (re)opened when its file changed, ex: written by the leader after ingestion
+    '''
+    path = state.snapshot_path
+    if not path or not os.path.exists(path):
+        return None
+    mtime = os.stat(path).st_mtime_ns
+    if state.snapshot_mtime != mtime:
+        if state.snapshot:
+            # deferred while it is in use, see `SequenceStore.in_use`
+            state.snapshot.close()
+        state.snapshot = None
+        state.snapshot_mtime = mtime
+        try:
+            state.snapshot = SequenceStore(path)
+        except Exception:
+            # the snapshot is optional, an invalid file is ignored until it is written again
+            logging.exception('[ ERROR ] - Ignoring invalid snapshot: %s', path)
+    return state.snapshot
+
+def get_cache_key(state: State, *parts: Any) -> str:
+    '''
+    Builds the cache key of a request, see `make_cache_key`
+
+    Keys include the index generation, so results cached while the leader was populating
+    the index are not served once it is done, by any worker.
+    '''
+    return make_cache_key(state.leader.index_generation(), *parts)
+
+async def initialize_as_leader(state: State) -> None:
+    '''
+    Initializes and populates the index, then drops the cached results if it was populated
+
+    On failure, the leadership is released so that the next `/health-check` served 
+    by any worker retries.
+    '''
+    try:
+        populated = await state.es_client.initialize_es(populate=True)
+    except Exception:
+        logging.exception('[ ERROR ] - Failed to initialize the index')
+        state.leader.release()
+        return
+    if populated:
+        state.leader.mark_index_updated()
+        await state.cache.clear()
+
+def start_leader_initialization(state: State) -> None:
+    '''
+    Starts `initialize_as_leader` in the background if this worker just became the leader
+
+    Populating an index outlasts the worker timeout, it must not hold up the startup 
+    or a request.
+    '''
+    if state.leader.is_leader or not state.leader.try_acquire():
+        return
+    state.leader_task = asyncio.create_task(initialize_as_leader(state))
 
 async def on_startup() -> None:
     logging.info('on_startup')
     sleep(3)
+    service_config = get_service_config()
+    app.state.service_config = service_config
+    limits = get_search_limits_config()
+    app.state.search_limits = limits
+    app.state.admission = AdmissionController(
+        max_concurrency=limits['max_concurrency'],
+        max_queue=limits['max_queue'],
+        queue_timeout=limits['queue_timeout'],
+        retry_after=limits['retry_after']
+    )
+    app.state.cache = create_cache(
+        service_config['cache_backend'],
+        cache_dir=service_config['cache_dir'],
+        ttl=service_config['cache_ttl']
+    )
+    app.state.leader = LeaderLock(service_config['leader_lock_path'])
+    app.state.snapshot_path = get_es_client_config()['snapshot_path']
+    app.state.snapshot = None
+    app.state.snapshot_mtime = None
+    # memory-mapping the snapshot only reads its header
+    load_snapshot(app.state)
     app.state.es_client =  ElasticSearchClient()
-    await app.state.es_client.initialize_es(populate=True)
+    app.state.leader_task = None
+    # with several workers, only the leader initializes and populates the index
+    start_leader_initialization(app.state)
+
+async def on_shutdown() -> None:
+    '''
+    Closes the ES connections, once uvicorn drained the in-flight requests
+    (see `timeout_graceful_shutdown` and `app.workers`)
+    '''
+    logging.info('on_shutdown')
+    admission: AdmissionController = app.state.admission
+    if admission.in_flight:
+        logging.warning('[ WARNING ] - Shutting down with %s searches in flight', admission.in_flight)
+    leader_task: asyncio.Task = app.state.leader_task
+    if leader_task and not leader_task.done():
+        # the index is left without its populated marker, the next leader populates it again
+        leader_task.cancel()
+        await asyncio.gather(leader_task, return_exceptions=True)
+    await app.state.es_client.close_connection()
+    await app.state.cache.close()
+    if app.state.snapshot:
+        app.state.snapshot.close()
+    app.state.leader.release()
 
 logging.basicConfig(filename='app_log.log', level=logging.INFO)
-app = FastAPI(on_startup=[on_startup])
+app = FastAPI(on_startup=[on_startup], on_shutdown=[on_shutdown])
 
 def get_es(request: Request) -> ElasticSearchClient:
     return request.app.state.es_client
 
+async def run_admitted(
+    request: Request,
+    make_search: Callable[[], Awaitable[Any]]
+) -> Union[Any, JSONResponse]:
+    '''
+    Runs an ES search through admission control, within the `search_timeout` deadline
+
+    :param make_search: callable creating the ES search coroutine once a slot is granted
+
+    Returns the search result, or the error response if the search was rejected or cancelled
+    '''
+    admission: AdmissionController = request.app.state.admission
+    deadline = request.app.state.search_limits['search_timeout']
+    try:
+        async with admission.admit():
+            return await admission.run(
+                make_search(),
+                timeout=deadline,
+                is_disconnected=request.is_disconnected
+            )
+    except AdmissionRejected as err:
+        return JSONResponse(
+            'TOO_MANY_REQUESTS',
+            status_code=429,
+            headers={'Retry-After': str(err.retry_after)}
+        )
+    except (asyncio.TimeoutError, ConnectionTimeout):
+        # past the deadline, cancelled by admission control or timed out by the ES transport
+        return JSONResponse('GATEWAY_TIMEOUT', status_code=504)
+    except ClientDisconnected:
+        # nobody is left to read the response
+        return JSONResponse('CLIENT_CLOSED_REQUEST', status_code=499)
+
 @app.get('/health-check')
-async def health_check(es_client: ElasticSearchClient = Depends(get_es)):
+async def health_check(request: Request, es_client: ElasticSearchClient = Depends(get_es)):
     assert isinstance(es_client, ElasticSearchClient)
     es_ping = await es_client.health_check()
     if es_ping:
-        await es_client.initialize_es(populate=True)
+        # a worker takes over the leadership if the previous leader exited
+        start_leader_initialization(request.app.state)
         return JSONResponse('OK', status_code=200)
     else:
         return JSONResponse('INTERNAL_SERVER_ERROR', status_code=500)
 
 @app.get('/api/search/')
 async def search(
+    request: Request,
     text: str,
     fields: List[str] = None,
     page: int = 0,
     size: int = 20,
     with_highlight: bool = False,
     return_fields: List[str] = None,
+    with_positions: bool = False,
+    snippet_window: int = 0,
     es_client: ElasticSearchClient = Depends(get_es),
 ):
     '''
     Endpoint to search an index based on the given text and criteria 
     and returns paginated matching documents
+
+    `with_positions` adds the [start, end] offsets of `text` in the `bases` of each document 
+    (and with `snippet_window`, the bases around each of them), it is much cheaper 
+    than `with_highlight`.
+    Searches go through admission control: a search waiting too long for a slot is rejected
+    with a 429, and a search is cancelled once past its deadline or if the client disconnects.
     '''
-    r = await es_client.search_index(
+    limits = request.app.state.search_limits
+    if page < 0 or size < 0 or snippet_window < 0:
+        return JSONResponse(
+            {'detail': '`page`, `size` and `snippet_window` must be positive'}, status_code=400)
+    if snippet_window > limits['max_snippet_window']:
+        return JSONResponse(
+            {'detail': f'`snippet_window` must be at most {limits["max_snippet_window"]}'},
+            status_code=400
+        )
+    if size > limits['max_size']:
+        return JSONResponse(
+            {'detail': f'`size` must be at most {limits["max_size"]}'}, status_code=400)
+    if (page + 1) * size > limits['max_page_depth']:
+        return JSONResponse(
+            {'detail': f'Results past the first {limits["max_page_depth"]} can not be paginated'},
+            status_code=400
+        )
+
+    cache = request.app.state.cache
+    cache_key = get_cache_key(
+        request.app.state,
+        text, fields, page, size, with_highlight, return_fields, with_positions, snippet_window
+    )
+    r = await cache.get(cache_key)
+    if r is not None:
+        return JSONResponse(r, status_code=200)
+
+    deadline = limits['search_timeout']
+    r = await run_admitted(request, lambda: es_client.search_index(
         text,
         fields=fields,
         page=page,
         size=size,
         with_highlight=with_highlight,
-        return_fields=return_fields
-    )
+        return_fields=return_fields,
+        timeout=deadline,
+        with_positions=with_positions,
+        snippet_window=snippet_window
+    ))
+    if isinstance(r, JSONResponse):
+        return r
+    if not r['timed_out']:
+        await cache.set(cache_key, r)
+    return JSONResponse(r, status_code=200)
+
+@app.get('/api/analytics/')
+async def analytics(
+    request: Request,
+    text: str = None,
+    fields: List[str] = None,
+    creators_size: int = 10,
+    date_interval: str = 'month',
+    length_interval: int = 1000,
+    gc_interval: float = 0.05,
+    es_client: ElasticSearchClient = Depends(get_es),
+):
+    '''
+    Endpoint returning bucket counts of the documents matching the given text 
+    (all documents if not set): per creator, per `createdAt` interval, 
+    per `bases_length` and per `gc_content` range
+    '''
+    if date_interval not in DATE_INTERVALS:
+        return JSONResponse(
+            {'detail': f'`date_interval` must be one of {", ".join(DATE_INTERVALS)}'},
+            status_code=400
+        )
+    if creators_size <= 0 or length_interval <= 0 or gc_interval <= 0:
+        return JSONResponse(
+            {'detail': '`creators_size`, `length_interval` and `gc_interval` must be positive'},
+            status_code=400
+        )
+
+    cache = request.app.state.cache
+    cache_key = get_cache_key(
+        request.app.state, 'analytics', text, fields, creators_size, date_interval, length_interval, gc_interval)
+    r = await cache.get(cache_key)
+    if r is not None:
+        return JSONResponse(r, status_code=200)
+
+    deadline = request.app.state.search_limits['search_timeout']
+    r = await run_admitted(request, lambda: es_client.aggregate_index(
+        text=text,
+        fields=fields,
+        creators_size=creators_size,
+        date_interval=date_interval,
+        length_interval=length_interval,
+        gc_interval=gc_interval,
+        timeout=deadline
+    ))
+    if isinstance(r, JSONResponse):
+        return r
+    if not r['timed_out']:
+        await cache.set(cache_key, r)
     return JSONResponse(r, status_code=200)
 
+@app.get('/api/snapshot/')
+async def snapshot_info(request: Request, verify: bool = False):
+    '''
+    Endpoint returning the number of documents in the snapshot, 
+    and with `verify`, whether the snapshot passes its integrity check
+    '''
+    snapshot = load_snapshot(request.app.state)
+    if not snapshot:
+        return JSONResponse('NOT_FOUND', status_code=404)
+    r = {'count': snapshot.count}
+    if verify:
+        # the checksum reads the whole file, off the event loop
+        with snapshot.in_use():
+            r['valid'] = await asyncio.to_thread(snapshot.verify)
+    return JSONResponse(r, status_code=200)
+
+@app.get('/api/snapshot/{doc_id}')
+async def snapshot_get_by_id(request: Request, doc_id: str):
+    '''
+    Endpoint returning a document from the snapshot by ID, without querying ES
+    '''
+    snapshot = load_snapshot(request.app.state)
+    doc = snapshot.get(doc_id) if snapshot else None
+    if not doc:
+        return JSONResponse('NOT_FOUND', status_code=404)
+    return JSONResponse(doc, status_code=200)
+
+@app.get('/metrics')
+async def metrics(request: Request):
+    '''
+    Admission control metrics of the worker serving the request
+    '''
+    return JSONResponse(request.app.state.admission.metrics(), status_code=200)
+
 if __name__ == '__main__':
-    uvicorn.run(app, log_level=logging.INFO, port=80)
+    uvicorn.run(
+        app,
+        log_level=logging.INFO,
+        port=80,
+        timeout_graceful_shutdown=int(get_service_config()['drain_timeout'])
+    )
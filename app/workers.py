@@ -0,0 +1,17 @@
+from uvicorn.workers import UvicornWorker
+
+from .elastic_search.utils.get_es_config import get_service_config
+
+
+class DrainingUvicornWorker(UvicornWorker):
+    '''
+    Uvicorn worker draining its in-flight requests on shutdown
+
+    Once it stops accepting connections, uvicorn waits up to `drain_timeout` seconds for the
+    open ones to complete, then cancels them and runs the app shutdown (closing ES).
+    '''
+
+    CONFIG_KWARGS = {
+        **UvicornWorker.CONFIG_KWARGS,
+        'timeout_graceful_shutdown': int(get_service_config()['drain_timeout']),
+    }
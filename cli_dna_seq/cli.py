@@ -7,6 +7,8 @@ from rich import print as rich_print
 from rich.console import Console
 from rich.table import Table
 
+from app.elastic_search.utils.get_es_config import get_es_client_config
+from app.elastic_search.utils.snapshot import open_snapshot
 from cli_dna_seq import (SUCCESS, ElasticSearchClient, __app_name__,
                          __version__, async_helper, config)
 
@@ -102,6 +104,18 @@ def search(
         "--return-fields",
         help="Comma separated list of fields to return from the ES doument. "
     ),
+    with_positions: bool = typer.Option(
+        False,
+        "--with-positions",
+        "-wp",
+        help="If true will return the [start, end] positions of the text in the bases, cheaper than --with-highlight",
+        is_flag=True
+    ),
+    snippet_window: int = typer.Option(
+        0,
+        "--snippet-window",
+        help="With --with-positions, number of bases to show on each side of the positions"
+    ),
 ):
     '''
     Search an index based on the given text and criteria and returns paginated matching documents
@@ -120,7 +134,9 @@ def search(
         page=page,
         size=size,
         with_highlight=with_highlight,
-        return_fields=return_fields
+        return_fields=return_fields,
+        with_positions=with_positions,
+        snippet_window=snippet_window
     ), loop)
     
     if r['total']:
@@ -135,16 +151,26 @@ def search(
         data_table = Table('ID', 'Name', 'Bases', 'Created At', 'Creator ID', 'Creator Name')
         if with_highlight:
             data_table.add_column('highlights')
+        if with_positions:
+            data_table.add_column('positions')
+        if with_positions and snippet_window:
+            data_table.add_column('snippets')
         for hit in hits:
+            # FASTA/FASTQ documents only have a name and bases
+            creator = hit.get('creator') or {}
             row_data = [hit['id'],
-                hit['name'],
-                hit['bases'],
-                hit['createdAt'],
-                hit['creator']['id'],
-                hit['creator']['name']
+                hit.get('name', ''),
+                hit.get('bases', ''),
+                hit.get('createdAt', ''),
+                creator.get('id', ''),
+                creator.get('name', '')
                 ]
             if with_highlight:
                 row_data.append(str(hit['highlight']['bases']))
+            if with_positions:
+                row_data.append(str(hit['positions']))
+            if with_positions and snippet_window:
+                row_data.append('\n'.join(hit.get('snippets', [])))
             data_table.add_row(*row_data)
 
         console = Console()
@@ -163,6 +189,77 @@ def search(
     else:
         print(f'No documents were found matching "{text}"')
 
+@app.command('analytics')
+def analytics(
+    text: str = typer.Option(
+        None,
+        "--text",
+        "-t",
+        help="text to query, aggregates all documents if not set"
+    ),
+    fields: str = typer.Option(
+        None,
+        "--fields",
+        "-f",
+        help="Comma separated list fields to query (only valid options: 'bases', 'name', 'creatror.handle', 'creator.name')",
+    ),
+    creators_size: int = typer.Option(
+        10,
+        "--creators-size",
+        help="Number of creators to return, most documents first"
+    ),
+    date_interval: str = typer.Option(
+        'month',
+        "--date-interval",
+        help="Interval of the `createdAt` buckets: minute, hour, day, week, month, quarter or year"
+    ),
+    length_interval: int = typer.Option(
+        1000,
+        "--length-interval",
+        help="Width of the bases length buckets"
+    ),
+    gc_interval: float = typer.Option(
+        0.05,
+        "--gc-interval",
+        help="Width of the GC content buckets"
+    ),
+):
+    '''
+    Count the documents matching the given text per creator, per created at date, 
+    per bases length and per GC content, without fetching the documents
+    '''
+    es = ElasticSearchClient()
+
+    if fields:
+        fields = fields.split(',')
+
+    loop = asyncio.new_event_loop()
+    r = async_helper.make_async_call(es.aggregate_index(
+        text=text,
+        fields=fields,
+        creators_size=creators_size,
+        date_interval=date_interval,
+        length_interval=length_interval,
+        gc_interval=gc_interval
+    ), loop)
+    async_helper.make_async_call(es.close_connection(), loop)
+    if isinstance(r, Exception):
+        typer.secho(f'Aggregating the index failed with "{r}"', fg=typer.colors.RED)
+        raise typer.Exit(1)
+
+    console = Console()
+    console.print(f'Total: {r["total"]}')
+    for title, aggregation in [
+        ('Creator ID', 'creators'),
+        ('Created At', 'created_at'),
+        ('Bases Length', 'bases_length'),
+        ('GC Content', 'gc_content'),
+    ]:
+        table = Table(title, 'Count')
+        for bucket in r[aggregation]:
+            table.add_row(f'{bucket["key"]}', f'{bucket["count"]}')
+        console.print(table)
+
 @app.command('get-by-id')
 def get_by_id(
     _id: str = typer.Option(
@@ -174,16 +271,82 @@ def get_by_id(
         '--view-bases',
         help='will display the value "bases" value',
         is_flag=True
+    ),
+    from_snapshot: bool = typer.Option(
+        False,
+        '--from-snapshot',
+        help='will read the document from the snapshot instead of ES',
+        is_flag=True
     )
 ):
     '''
     Search an index based on the given text and criteria and returns paginated matching documents
     '''
-    es = ElasticSearchClient()
-    loop = asyncio.new_event_loop()
-    r = async_helper.make_async_call(es.get_doc_by_id(_id), loop)
+    if from_snapshot:
+        snapshot = open_snapshot(get_es_client_config()['snapshot_path'])
+        if not snapshot:
+            typer.secho('No snapshot found, run `python3 -m cli_dna_seq snapshot-build`', fg=typer.colors.RED)
+            raise typer.Exit(1)
+        r = snapshot.get(_id)
+        snapshot.close()
+    else:
+        es = ElasticSearchClient()
+        loop = asyncio.new_event_loop()
+        r = async_helper.make_async_call(es.get_doc_by_id(_id), loop)
     if view_bases:
         rich_print(r)
     else:
         data_table = Table('ID', 'Name', 'Bases', 'Created At', 'Creator ID', 'Creator Name')
         Console.print(data_table)
+
+@app.command('snapshot-build')
+def snapshot_build(
+    path: str = typer.Option(
+        None,
+        '--path',
+        help='snapshot file path, defaults to `snapshot_file_name` in config.ini'
+    )
+):
+    '''
+    Write a snapshot of the documents of the index, read from ES
+    '''
+    es = ElasticSearchClient()
+    loop = asyncio.new_event_loop()
+    r = async_helper.make_async_call(es.write_snapshot(path=path), loop)
+    async_helper.make_async_call(es.close_connection(), loop)
+    if isinstance(r, Exception):
+        typer.secho(f'Writing the snapshot failed with "{r}"', fg=typer.colors.RED)
+        raise typer.Exit(1)
+    typer.secho(f'Wrote a snapshot of {r} documents', fg=typer.colors.GREEN)
+
+@app.command('snapshot-info')
+def snapshot_info(
+    path: str = typer.Option(
+        None,
+        '--path',
+        help='snapshot file path, defaults to `snapshot_file_name` in config.ini'
+    ),
+    verify: bool = typer.Option(
+        False,
+        '--verify',
+        help='will check the snapshot integrity',
+        is_flag=True
+    )
+):
+    '''
+    Show the number of documents in the snapshot, without reading the data files or ES
+    '''
+    snapshot = open_snapshot(path or get_es_client_config()['snapshot_path'])
+    if not snapshot:
+        typer.secho('No snapshot found, run `python3 -m cli_dna_seq snapshot-build`', fg=typer.colors.RED)
+        raise typer.Exit(1)
+    typer.echo(f'{snapshot.path}: {snapshot.count} documents')
+    if verify:
+        valid = snapshot.verify()
+        typer.secho(
+            'Integrity check passed' if valid else 'Integrity check failed',
+            fg=typer.colors.GREEN if valid else typer.colors.RED
+        )
+    snapshot.close()
+    if verify and not valid:
+        raise typer.Exit(1)
@@ -0,0 +1,88 @@
+'''
+Benchmark of the bulk body generation
+
+Compares, without ES, the CPU time spent building the `_bulk` request bodies of a directory:
+the dict path (`actions_list_gen` + per action serialization, as done by the ES client)
+against the pre-serialized path (`bulk_body_gen`).
+With `--ndjson`, the documents are first copied into a single NDJSON file, the format
+of large corpora.
+
+ex: python3 scripts/bench_ingest.py --files-dir app/data/test_set --repeat 400
+'''
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app.elastic_search.utils.bulk_data_helper import (actions_list_gen,  # noqa: E402
+                                                       bulk_body_gen,
+                                                       get_bulk_json_data_generator)
+
+
+def dict_bodies(files_dir: str, chunk_size: int) -> int:
+    # same serialization as the ES client: one compact JSON line per action and document
+    size = 0
+    for actions, _ in actions_list_gen(files_dir, 'bench', chunk_size):
+        lines = [json.dumps(action, default=str, separators=(',', ':')) for action in actions]
+        size += len(('\n'.join(lines) + '\n').encode('utf-8'))
+    return size
+
+
+def raw_bodies(files_dir: str, chunk_size: int) -> int:
+    return sum(len(body) for body, _ in bulk_body_gen(files_dir, 'bench', chunk_size))
+
+
+def best_times(fns: list, files_dir: str, chunk_size: int, repeat: int, rounds: int) -> list[float]:
+    # rounds of the functions are interleaved, and CPU time is measured rather than wall time,
+    # so that a load change on the host skews all of them alike
+    timings = [[] for _ in fns]
+    for _ in range(rounds):
+        for fn, fn_timings in zip(fns, timings):
+            start = time.process_time()
+            for _ in range(repeat):
+                fn(files_dir, chunk_size)
+            fn_timings.append(time.process_time() - start)
+    return [min(fn_timings) for fn_timings in timings]
+
+
+def write_ndjson(files_dir: str, repeat: int, out_dir: str) -> str:
+    path = os.path.join(out_dir, 'bench.ndjson')
+    with open(path, 'w', encoding='utf-8') as f:
+        for _ in range(repeat):
+            for _id, doc in get_bulk_json_data_generator(files_dir):
+                doc = {'id': str(_id), **doc}
+                doc.pop('bases_length', None)
+                doc.pop('gc_content', None)
+                f.write(json.dumps(doc, separators=(',', ':')) + '\n')
+    return path
+
+
+def run(args: argparse.Namespace) -> None:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        files_dir, repeat = args.files_dir, args.repeat
+        if args.ndjson:
+            write_ndjson(files_dir, args.repeat, tmp_dir)
+            files_dir, repeat = tmp_dir, 1
+        docs = sum(count for _, count in bulk_body_gen(files_dir, 'bench', args.chunk_size))
+        docs *= repeat
+        dict_time, raw_time = best_times(
+            [dict_bodies, raw_bodies], files_dir, args.chunk_size, repeat, args.rounds)
+
+    print(f'documents:   {docs}')
+    print(f'dict path:   {dict_time:.3f}s ({docs / dict_time:.0f} docs/s)')
+    print(f'raw path:    {raw_time:.3f}s ({docs / raw_time:.0f} docs/s)')
+    print(f'speedup:     {dict_time / raw_time:.2f}x')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the bulk body generation')
+    parser.add_argument('--files-dir', default='app/data/test_set', help='directory of the data files')
+    parser.add_argument('--repeat', type=int, default=400, help='passes over the directory')
+    parser.add_argument('--chunk-size', type=int, default=500, help='documents per bulk request')
+    parser.add_argument('--rounds', type=int, default=5, help='timed rounds, the best is reported')
+    parser.add_argument('--ndjson', action='store_true', help='benchmark a single NDJSON file')
+    run(parser.parse_args())
@@ -0,0 +1,85 @@
+'''
+Load test for the search API
+
+Sends concurrent `/api/search/` requests for a fixed duration and reports the QPS and latencies.
+To check the scaling with the number of workers, run it against the service started
+with `WEB_CONCURRENCY=1`, `2`, `4`... (see `Scale-out mode` in the README) and compare the QPS.
+
+ex: python3 scripts/load_test.py --url http://localhost:8000 --concurrency 64 --duration 30
+'''
+import argparse
+import asyncio
+import random
+import time
+
+import aiohttp
+
+
+def random_query(min_len: int, max_len: int) -> str:
+    # random bases, so that most requests miss the search cache
+    return ''.join(random.choices('acgt', k=random.randint(min_len, max_len)))
+
+
+async def worker(
+    session: aiohttp.ClientSession,
+    url: str,
+    deadline: float,
+    latencies: list[float],
+    errors: dict[int, int],
+    args: argparse.Namespace
+) -> None:
+    while time.monotonic() < deadline:
+        params = {'text': random_query(args.min_len, args.max_len), 'size': args.size}
+        start = time.monotonic()
+        try:
+            async with session.get(url, params=params) as resp:
+                await resp.read()
+                status = resp.status
+        except aiohttp.ClientError:
+            status = 0
+        if status == 200:
+            latencies.append(time.monotonic() - start)
+        else:
+            errors[status] = errors.get(status, 0) + 1
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * pct))]
+
+
+async def run(args: argparse.Namespace) -> None:
+    url = args.url.rstrip('/') + '/api/search/'
+    latencies: list[float] = []
+    errors: dict[int, int] = {}
+    connector = aiohttp.TCPConnector(limit=args.concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        start = time.monotonic()
+        deadline = start + args.duration
+        await asyncio.gather(*[
+            worker(session, url, deadline, latencies, errors, args)
+            for _ in range(args.concurrency)
+        ])
+        elapsed = time.monotonic() - start
+
+    latencies.sort()
+    print(f'requests:    {len(latencies)} ok, {sum(errors.values())} failed {errors or ""}')
+    print(f'throughput:  {len(latencies) / elapsed:.1f} QPS')
+    print(
+        'latency:     '
+        f'p50 {percentile(latencies, 0.50) * 1000:.1f}ms, '
+        f'p95 {percentile(latencies, 0.95) * 1000:.1f}ms, '
+        f'p99 {percentile(latencies, 0.99) * 1000:.1f}ms'
+    )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load test the search API')
+    parser.add_argument('--url', default='http://localhost:8000', help='base url of the service')
+    parser.add_argument('--concurrency', type=int, default=64, help='concurrent requests')
+    parser.add_argument('--duration', type=float, default=30, help='test duration in seconds')
+    parser.add_argument('--size', type=int, default=20, help='`size` of each search')
+    parser.add_argument('--min-len', type=int, default=4, help='min length of the query text')
+    parser.add_argument('--max-len', type=int, default=8, help='max length of the query text')
+    asyncio.run(run(parser.parse_args()))
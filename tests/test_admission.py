@@ -0,0 +1,98 @@
+import asyncio
+
+import pytest
+
+from app.admission import (AdmissionController, AdmissionRejected,
+                           ClientDisconnected)
+
+
+async def connected() -> bool:
+    return False
+
+
+async def disconnected() -> bool:
+    return True
+
+
+def test_admit_sheds_when_queue_is_full():
+    async def run():
+        admission = AdmissionController(max_concurrency=1, max_queue=0, queue_timeout=1)
+        async with admission.admit():
+            assert admission.in_flight == 1
+            with pytest.raises(AdmissionRejected) as err:
+                async with admission.admit():
+                    pass
+            assert err.value.retry_after == 1
+        assert admission.in_flight == 0
+        return admission.metrics()
+
+    metrics = asyncio.run(run())
+    assert metrics['admitted_total'] == 1
+    assert metrics['shed_total'] == 1
+
+
+def test_admit_queue_timeout():
+    async def run():
+        admission = AdmissionController(max_concurrency=1, max_queue=10, queue_timeout=0.05)
+        async with admission.admit():
+            with pytest.raises(AdmissionRejected):
+                async with admission.admit():
+                    pass
+            assert admission.queue_depth == 0
+        return admission.metrics()
+
+    assert asyncio.run(run())['shed_total'] == 1
+
+
+def test_admit_waits_for_a_slot():
+    async def run():
+        admission = AdmissionController(max_concurrency=1, max_queue=10, queue_timeout=1)
+        order = []
+
+        async def search(name: str) -> None:
+            async with admission.admit():
+                order.append(name)
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(search('first'), search('second'))
+        return order, admission.metrics()
+
+    order, metrics = asyncio.run(run())
+    assert order == ['first', 'second']
+    assert metrics['admitted_total'] == 2 and metrics['shed_total'] == 0
+
+
+def test_run_returns_result():
+    async def run():
+        admission = AdmissionController()
+        return await admission.run(asyncio.sleep(0, result='hits'), timeout=1, is_disconnected=connected)
+
+    assert asyncio.run(run()) == 'hits'
+
+
+def test_run_deadline_cancels_search():
+    async def run():
+        admission = AdmissionController()
+        search = asyncio.ensure_future(asyncio.sleep(10))
+        with pytest.raises(asyncio.TimeoutError):
+            await admission.run(search, timeout=0.05, is_disconnected=connected, poll_interval=0.01)
+        await asyncio.sleep(0)
+        return search.cancelled(), admission.metrics()
+
+    cancelled, metrics = asyncio.run(run())
+    assert cancelled
+    assert metrics['timeout_total'] == 1
+
+
+def test_run_client_disconnect_cancels_search():
+    async def run():
+        admission = AdmissionController()
+        search = asyncio.ensure_future(asyncio.sleep(10))
+        with pytest.raises(ClientDisconnected):
+            await admission.run(search, timeout=5, is_disconnected=disconnected, poll_interval=0.01)
+        await asyncio.sleep(0)
+        return search.cancelled(), admission.metrics()
+
+    cancelled, metrics = asyncio.run(run())
+    assert cancelled
+    assert metrics['cancelled_total'] == 1
@@ -0,0 +1,124 @@
+import asyncio
+import json
+
+import pytest
+from fastapi import Request
+
+from app.admission import AdmissionController
+from app.cache import MemoryCache
+from app.elastic_search.client import ElasticSearchClient
+from app.leader import LeaderLock
+from app.main import analytics, app
+
+AGGREGATION_RESPONSE = {
+    'hits': {'total': {'value': 3}},
+    'timed_out': False,
+    'aggregations': {
+        'creators': {'buckets': [{'key': 'ent_1', 'doc_count': 2}, {'key': 'ent_2', 'doc_count': 1}]},
+        'created_at': {'buckets': [
+            {'key': 1588291200000, 'key_as_string': '2020-05-01T00:00:00.000Z', 'doc_count': 3}
+        ]},
+        'bases_length': {'buckets': [{'key': 0.0, 'doc_count': 1}, {'key': 1000.0, 'doc_count': 2}]},
+        'gc_content': {'buckets': [
+            {'key': 0.35000000000000003, 'doc_count': 1}, {'key': 0.4, 'doc_count': 2}
+        ]},
+    }
+}
+
+EXPECTED_RESULT = {
+    'total': 3,
+    'timed_out': False,
+    'creators': [{'key': 'ent_1', 'count': 2}, {'key': 'ent_2', 'count': 1}],
+    'created_at': [{'key': '2020-05-01T00:00:00.000Z', 'count': 3}],
+    'bases_length': [{'key': 0.0, 'count': 1}, {'key': 1000.0, 'count': 2}],
+    'gc_content': [{'key': 0.35, 'count': 1}, {'key': 0.4, 'count': 2}],
+}
+
+
+class StubSearchClient:
+    def __init__(self):
+        self.searches = []
+        self.request_timeout = None
+
+    def options(self, request_timeout=None):
+        self.request_timeout = request_timeout
+        return self
+
+    async def search(self, **kwargs):
+        self.searches.append(kwargs)
+        return AGGREGATION_RESPONSE
+
+
+def make_es_client() -> ElasticSearchClient:
+    es_client = ElasticSearchClient.__new__(ElasticSearchClient)
+    es_client.index_name = 'sequences'
+    es_client._client = StubSearchClient()
+    return es_client
+
+
+def test_aggregate_index():
+    es_client = make_es_client()
+    result = asyncio.run(es_client.aggregate_index(
+        text='acg', fields=['name'], creators_size=5, date_interval='day',
+        length_interval=500, gc_interval=0.1, timeout=2
+    ))
+    assert result == EXPECTED_RESULT
+    search = es_client._client.searches[0]
+    assert search['size'] == 0 and search['index'] == 'sequences'
+    assert search['query'] == {'query_string': {'query': '*acg*', 'fields': ['name']}}
+    assert search['aggregations']['creators']['terms']['size'] == 5
+    assert search['aggregations']['created_at']['date_histogram']['calendar_interval'] == 'day'
+    assert search['aggregations']['bases_length']['histogram']['interval'] == 500
+    assert search['aggregations']['gc_content']['histogram']['interval'] == 0.1
+    assert es_client._client.request_timeout == 2 and search['timeout'] == '1600ms'
+
+
+def test_aggregate_index_all_documents():
+    es_client = make_es_client()
+    asyncio.run(es_client.aggregate_index())
+    search = es_client._client.searches[0]
+    assert search['query'] == {'match_all': {}}
+    assert search['timeout'] is None
+
+
+def call_analytics(tmp_path, es_client: ElasticSearchClient, **params):
+    # the endpoint is called directly, the state set up by the startup handlers is stubbed
+    app.state.cache = MemoryCache(ttl=60)
+    app.state.leader = LeaderLock(str(tmp_path / 'leader.lock'))
+    app.state.admission = AdmissionController(max_concurrency=1, max_queue=1, queue_timeout=1)
+    app.state.search_limits = {'search_timeout': 2}
+
+    async def receive():
+        return {'type': 'http.request'}
+
+    async def run():
+        request = Request({'type': 'http', 'app': app, 'headers': []}, receive)
+        first = await analytics(request, **params, es_client=es_client)
+        second = await analytics(request, **params, es_client=es_client)
+        return first, second
+
+    return asyncio.run(run())
+
+
+def test_analytics(tmp_path):
+    es_client = make_es_client()
+    response, cached = call_analytics(tmp_path, es_client, text='acg', date_interval='year')
+    assert response.status_code == 200
+    assert json.loads(response.body) == EXPECTED_RESULT
+    # the second call is served from the cache
+    assert json.loads(cached.body) == EXPECTED_RESULT
+    assert len(es_client._client.searches) == 1
+
+
+@pytest.mark.parametrize('params', [
+    {'date_interval': 'fortnight'},
+    {'creators_size': 0},
+    {'length_interval': -1000},
+    {'gc_interval': 0},
+])
+def test_analytics_invalid_params(tmp_path, params):
+    es_client = make_es_client()
+    response, _ = call_analytics(tmp_path, es_client, **params)
+    assert response.status_code == 400
+    assert 'must be' in json.loads(response.body)['detail']
+    assert es_client._client.searches == []
@@ -0,0 +1,118 @@
+import json
+
+import pytest
+
+from app.elastic_search.utils.bulk_data_helper import (add_raw_sequence_stats,
+                                                       add_sequence_stats,
+                                                       bulk_body_gen,
+                                                       extract_raw_id,
+                                                       get_raw_sequence_stats,
+                                                       get_sequence_stats,
+                                                       prepare_raw_document,
+                                                       scan_raw_members)
+
+
+def decoded_id_and_doc(raw_doc: bytes) -> tuple:
+    doc = json.loads(raw_doc)
+    return doc.pop('id', None), doc
+
+
+@pytest.mark.parametrize('raw_doc', [
+    b'{"id":"a","bases":"acgt"}',
+    b'{"bases":"acgt", "id" : "a"}',
+    b'{"id":"a"}',
+    b'{ }',
+    b'  {"a":true , "id":"x" , "n":-1.5e3}  ',
+    b'{"creator":{"id":"c1"},"tags":[{"id":1}],"id":"q\\"x\\\\","name":"\\\\"}',
+    b'{"name":"a,\\"id\\":\\"b","id":"real"}',
+    b'{"a":{"b":{"id":"deep"}},"id":"top"}',
+    b'{"creator":{"id":"c1"}}',
+    b'{"id":5,"bases":"acgt"}',
+    b'{"bases":"acgt","id":null}',
+    b'{"\\u0069d":"x","a":1}',
+])
+def test_extract_raw_id(raw_doc):
+    _id, raw = extract_raw_id(raw_doc)
+    assert (_id, json.loads(raw)) == decoded_id_and_doc(raw_doc)
+
+
+def test_scan_raw_members():
+    raw_doc = b'{"id": "a", "creator": {"id": "c1"}, "n": 1}'
+    members = scan_raw_members(raw_doc)
+    assert [key for key, *_ in members] == [b'"id"', b'"creator"', b'"n"']
+    _, _, value_start, value_end = members[1]
+    assert raw_doc[value_start:value_end] == b'{"id": "c1"}'
+
+
+@pytest.mark.parametrize('raw_doc', [b'{"a":1', b'{"a":"x', b'{"a":1}x', b'[1]', b'{"a":{"b":{"c":1}}}'])
+def test_scan_raw_members_unsupported(raw_doc):
+    assert scan_raw_members(raw_doc) is None
+
+
+@pytest.mark.parametrize('raw_doc', [
+    # common layout, handled by the fast path
+    b'{"bases": "acgGTC", "createdAt": "2020", "creator": {"id": "c1"}, "id": "s1", "name": "n"}',
+    b'{"id":"s2","bases":"ACGT"}',
+    b'{"bases":""}',
+    # `bases` also in a nested object or a string value
+    b'{"creator":{"bases":"x"},"bases":"gggg","id":"a"}',
+    b'{"name":"\\"bases\\": \\"tt","bases":"gc"}',
+    # escaped or non ASCII bases
+    b'{"id":"a","bases":"ac\\u0067t"}',
+    b'{"bases":"\xc3\xa9ac","id":"b"}',
+    # not a string, or the stats fields already set
+    b'{"bases":null,"id":"z"}',
+    b'{"bases":"acgT","bases_length":3,"id":"a"}',
+    b'{"bases":"gc","bases":"at"}',
+])
+def test_prepare_raw_document(raw_doc):
+    _id, doc = decoded_id_and_doc(raw_doc)
+    prepared_id, raw = prepare_raw_document(raw_doc)
+    assert (prepared_id, json.loads(raw)) == (_id, add_sequence_stats(doc))
+    assert raw.count(b'"bases_length"') == int('bases' in doc and isinstance(doc['bases'], str))
+
+
+def test_sequence_stats():
+    assert get_sequence_stats('GgCcAaTt') == {'bases_length': 8, 'gc_content': 0.5}
+    assert get_sequence_stats('') == {'bases_length': 0, 'gc_content': 0.0}
+    assert add_sequence_stats({'name': 'x'}) == {'name': 'x'}
+
+
+@pytest.mark.parametrize('bases', ['GgCcAaTt', 'acg', 'ACGTN', '', 'nnnn', 'gcGCgcGCat' * 300])
+def test_raw_sequence_stats(bases):
+    assert get_raw_sequence_stats(bases.encode('ascii')) == get_sequence_stats(bases)
+
+
+@pytest.mark.parametrize('raw_doc', [
+    b'{"id":"x","bases":"GgCcAaTt"}',
+    b'{"creator":{"bases":"x"},"bases":"gggg"}',
+    b'{"bases":"acgT","bases_length":3,"id":"a"}',
+    b'{"id":"a","bases":"ac\\u0067t"}',
+    b'{"name":"x"}',
+    b'{"bases":null,"id":"z"}',
+    b'{"bases":"","id":1}',
+    b'{"a":{"b":{"c":1}},"bases":"gc","id":"q"}',
+])
+def test_add_raw_sequence_stats(raw_doc):
+    assert json.loads(add_raw_sequence_stats(raw_doc)) == add_sequence_stats(json.loads(raw_doc))
+
+
+def test_raw_sequence_stats_keys_not_duplicated():
+    raw = add_raw_sequence_stats(b'{"bases":"gc","gc_content":0.1}')
+    assert raw.count(b'"gc_content"') == 1
+    assert json.loads(raw)['gc_content'] == 1.0
+
+
+def test_bulk_body_gen(tmp_path):
+    (tmp_path / 'seqs.ndjson').write_text(
+        '{"name":"one","id":"a","bases":"gc"}\n{"bases":"at"}\n{"id":"c","bases":"ac"}\n')
+    chunks = list(bulk_body_gen(str(tmp_path), 'my-index', 2))
+    assert [count for _, count in chunks] == [2, 1]
+    lines = b''.join(body for body, _ in chunks).splitlines()
+    actions, docs = [json.loads(line) for line in lines[::2]], [json.loads(line) for line in lines[1::2]]
+    assert [action['index']['_index'] for action in actions] == ['my-index'] * 3
+    assert actions[0]['index']['_id'] == 'a' and actions[2]['index']['_id'] == 'c'
+    # documents without an id get a generated one
+    assert actions[1]['index']['_id']
+    assert docs[0] == {'name': 'one', 'bases': 'gc', 'bases_length': 2, 'gc_content': 1.0}
+    assert all('id' not in doc for doc in docs)
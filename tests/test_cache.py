@@ -0,0 +1,86 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+from app.cache import FileCache, MemoryCache, create_cache, make_cache_key
+
+
+def test_make_cache_key():
+    assert make_cache_key('acgt', ['bases'], 0) == make_cache_key('acgt', ['bases'], 0)
+    assert make_cache_key('acgt', ['bases'], 0) != make_cache_key('acgt', ['bases'], 1)
+
+
+def test_memory_cache():
+    async def run():
+        cache = MemoryCache(ttl=60, max_entries=2)
+        await cache.set('a', 1)
+        await cache.set('b', {'hits': []})
+        await cache.set('c', 3)
+        values = [await cache.get(key) for key in ['a', 'b', 'c']]
+        await cache.clear()
+        return values, await cache.get('c')
+
+    values, cleared = asyncio.run(run())
+    # the oldest entry is dropped over max_entries
+    assert values == [None, {'hits': []}, 3]
+    assert cleared is None
+
+
+def test_memory_cache_expiry():
+    async def run():
+        cache = MemoryCache(ttl=0)
+        await cache.set('a', 1)
+        await asyncio.sleep(0.01)
+        return await cache.get('a')
+
+    assert asyncio.run(run()) is None
+
+
+def test_file_cache(tmp_path):
+    async def run():
+        cache = FileCache(str(tmp_path), ttl=60)
+        await cache.set('a', {'hits': [1]})
+        value = await cache.get('a')
+        missing = await cache.get('b')
+        await cache.clear()
+        return value, missing, await cache.get('a')
+
+    assert asyncio.run(run()) == ({'hits': [1]}, None, None)
+    assert not os.listdir(tmp_path)
+
+
+def test_file_cache_deletes_expired_entry_on_read(tmp_path):
+    async def run():
+        cache = FileCache(str(tmp_path), ttl=0)
+        await cache.set('a', 1)
+        await asyncio.sleep(0.01)
+        return await cache.get('a')
+
+    assert asyncio.run(run()) is None
+    assert not os.listdir(tmp_path)
+
+
+def test_file_cache_sweep(tmp_path):
+    async def run():
+        cache = FileCache(str(tmp_path), ttl=60, max_entries=2)
+        for i in range(4):
+            await cache.set(f'k{i}', i)
+        expired = os.path.join(str(tmp_path), 'k0.json')
+        os.utime(expired, (time.time() - 120, time.time() - 120))
+        # the next set is past the sweep interval
+        cache._next_sweep = 0
+        await cache.set('k4', 4)
+        return sorted(os.listdir(tmp_path))
+
+    # k0 expired, then the oldest entries are dropped down to max_entries
+    assert len(asyncio.run(run())) == 2
+    assert 'k0.json' not in os.listdir(tmp_path)
+
+
+def test_create_cache(tmp_path):
+    assert isinstance(create_cache('memory'), MemoryCache)
+    assert isinstance(create_cache('file', cache_dir=str(tmp_path)), FileCache)
+    with pytest.raises(Exception):
+        create_cache('redis')
@@ -0,0 +1,129 @@
+import gzip
+import json
+
+import pytest
+
+from app.elastic_search.utils import file_readers
+from app.elastic_search.utils.file_readers import (get_raw_reader, get_reader,
+                                                   read_fasta, read_fastq,
+                                                   read_json, read_json_raw,
+                                                   read_ndjson,
+                                                   read_ndjson_raw,
+                                                   split_extension)
+
+
+def test_split_extension():
+    assert split_extension('seqs.ndjson.gz') == ('.ndjson', '.gz')
+    assert split_extension('SEQ.JSON') == ('.json', '')
+    assert split_extension('reads.fq.zst') == ('.fq', '.zst')
+
+
+def test_get_reader():
+    assert get_reader('a.json') is read_json
+    assert get_reader('a.jsonl.gz') is read_ndjson
+    assert get_reader('a.fa') is read_fasta
+    assert get_reader('a.txt') is None
+    assert get_raw_reader('a.fasta') is None
+
+
+def test_read_json_single_document(tmp_path):
+    path = tmp_path / 'seq.json'
+    path.write_text('{\n  "id": "a",\n  "bases": "acgt"\n}\n')
+    assert list(read_json(str(path))) == [{'id': 'a', 'bases': 'acgt'}]
+    raw = list(read_json_raw(str(path)))
+    assert len(raw) == 1 and b'\n' not in raw[0]
+    assert json.loads(raw[0]) == {'id': 'a', 'bases': 'acgt'}
+
+
+def test_read_json_array_across_reads(tmp_path, monkeypatch):
+    # small reads split documents, numbers and literals across buffers
+    monkeypatch.setattr(file_readers, 'READ_BUFFER_SIZE', 7)
+    docs = [{'id': str(i), 'bases': 'acgt' * i, 'ok': i % 2 == 0, 'n': -1.5e3} for i in range(20)]
+    path = tmp_path / 'seqs.json'
+    path.write_text(json.dumps(docs, indent=2))
+    assert list(read_json(str(path))) == docs
+    assert [json.loads(raw) for raw in read_json_raw(str(path))] == docs
+
+
+def test_read_json_array_malformed_element(tmp_path):
+    path = tmp_path / 'seqs.json'
+    path.write_text('[{"id": "a"}, {"id": b}, ' + ' ' * (2 * 1024 * 1024) + '{"id": "c"}]')
+    docs = read_json(str(path))
+    assert next(docs) == {'id': 'a'}
+    with pytest.raises(json.JSONDecodeError):
+        next(docs)
+
+
+@pytest.mark.parametrize('content', [
+    '[{"id": "x"}{"bases": "gg"}]',
+    '[{"id": "x"},, {"bases": "tt"}]',
+    '[, {"id": "x"}]',
+    '[{"id": "x"},]',
+])
+def test_read_json_array_invalid_separators(tmp_path, content):
+    path = tmp_path / 'seqs.json'
+    path.write_text(content)
+    with pytest.raises(ValueError, match='seqs.json'):
+        list(read_json(str(path)))
+
+
+def test_read_json_array_non_object_element(tmp_path):
+    path = tmp_path / 'seqs.json'
+    path.write_text('[{"id": "x"}, ["gg"]]')
+    with pytest.raises(ValueError, match='Document 1 of .*seqs.json is not a JSON object'):
+        list(read_json(str(path)))
+
+
+def test_read_json_empty_array(tmp_path):
+    path = tmp_path / 'seqs.json'
+    path.write_text(' [ ] ')
+    assert list(read_json(str(path))) == []
+
+
+def test_read_ndjson_non_object_line(tmp_path):
+    path = tmp_path / 'seqs.ndjson'
+    path.write_text('{"id": "a"}\n"acgt"\n')
+    with pytest.raises(ValueError, match='Line 2 of'):
+        list(read_ndjson(str(path)))
+    with pytest.raises(ValueError, match='Line 2 of'):
+        list(read_ndjson_raw(str(path)))
+
+
+def test_read_json_array_unterminated(tmp_path):
+    path = tmp_path / 'seqs.json'
+    path.write_text('[{"id": "a"}, ')
+    with pytest.raises(ValueError):
+        list(read_json(str(path)))
+
+
+def test_read_ndjson_gzip(tmp_path):
+    path = tmp_path / 'seqs.ndjson.gz'
+    with gzip.open(path, 'wt') as f:
+        f.write('{"id": "a"}\n\n{"id": "b"}\n')
+    assert list(read_ndjson(str(path))) == [{'id': 'a'}, {'id': 'b'}]
+    assert list(read_ndjson_raw(str(path))) == [b'{"id": "a"}', b'{"id": "b"}']
+
+
+def test_read_fasta(tmp_path):
+    path = tmp_path / 'seqs.fasta'
+    path.write_text(';comment\n>seq one\nacgt\nACGT\n\n>seq two\nnnnn\n')
+    assert list(read_fasta(str(path))) == [
+        {'name': 'seq one', 'bases': 'acgtACGT'},
+        {'name': 'seq two', 'bases': 'nnnn'},
+    ]
+
+
+def test_read_fastq(tmp_path):
+    path = tmp_path / 'reads.fq'
+    path.write_text('@read1\nacgt\n+\n!!!!\n@read2\ngg\n+\n!!\n')
+    assert list(read_fastq(str(path))) == [
+        {'name': 'read1', 'bases': 'acgt'},
+        {'name': 'read2', 'bases': 'gg'},
+    ]
+
+
+def test_read_fastq_invalid_header(tmp_path):
+    path = tmp_path / 'reads.fq'
+    path.write_text('read1\nacgt\n+\n!!!!\n')
+    with pytest.raises(ValueError):
+        list(read_fastq(str(path)))
@@ -0,0 +1,147 @@
+import asyncio
+import os
+from types import SimpleNamespace
+
+from starlette.datastructures import State
+
+from app.elastic_search.client import ElasticSearchClient
+from app.leader import LeaderLock
+from app.main import initialize_as_leader, start_leader_initialization
+
+
+class StubCache:
+    def __init__(self):
+        self.cleared = 0
+
+    async def clear(self):
+        self.cleared += 1
+
+
+class StubEsClient:
+    def __init__(self, populated=True, error=None):
+        self.populated = populated
+        self.error = error
+        self.calls = 0
+
+    async def initialize_es(self, populate=False):
+        self.calls += 1
+        if self.error:
+            raise self.error
+        return self.populated
+
+
+def make_state(tmp_path, es_client) -> State:
+    state = State()
+    state.leader = LeaderLock(str(tmp_path / 'leader.lock'))
+    state.es_client = es_client
+    state.cache = StubCache()
+    state.leader_task = None
+    return state
+
+
+def test_leader_lock(tmp_path):
+    path = str(tmp_path / 'locks' / 'leader.lock')
+    leader, other = LeaderLock(path), LeaderLock(path)
+    assert leader.try_acquire() and leader.is_leader
+    assert not other.try_acquire()
+    generation = leader.index_generation()
+    os.utime(path, ns=(0, 0))
+    leader.mark_index_updated()
+    assert leader.index_generation() != generation
+    leader.release()
+    assert other.try_acquire()
+    other.release()
+
+
+def test_leader_initialization_runs_once(tmp_path):
+    es_client = StubEsClient()
+    state = make_state(tmp_path, es_client)
+
+    async def run():
+        start_leader_initialization(state)
+        task = state.leader_task
+        # later health checks of the leader do not start it again
+        start_leader_initialization(state)
+        await task
+        start_leader_initialization(state)
+        return task
+
+    task = asyncio.run(run())
+    assert state.leader_task is task
+    assert es_client.calls == 1
+    assert state.cache.cleared == 1
+    state.leader.release()
+
+
+def test_initialize_as_leader_not_populated(tmp_path):
+    state = make_state(tmp_path, StubEsClient(populated=False))
+    state.leader.try_acquire()
+    generation = state.leader.index_generation()
+    asyncio.run(initialize_as_leader(state))
+    assert state.leader.index_generation() == generation
+    assert state.cache.cleared == 0
+    state.leader.release()
+
+
+def test_initialize_as_leader_failure_releases_leadership(tmp_path):
+    state = make_state(tmp_path, StubEsClient(error=Exception('ES is down')))
+    state.leader.try_acquire()
+    asyncio.run(initialize_as_leader(state))
+    assert not state.leader.is_leader
+
+
+class StubIndices:
+    def __init__(self, exists, meta):
+        self.exists_result = exists
+        self.meta = meta
+        self.deleted = []
+
+    async def exists(self, index):
+        return SimpleNamespace(body=self.exists_result)
+
+    async def get_mapping(self, index):
+        return SimpleNamespace(body={index: {'mappings': {'_meta': self.meta}}})
+
+    async def delete(self, index):
+        self.deleted.append(index)
+
+
+def make_es_client(exists, meta) -> ElasticSearchClient:
+    es_client = ElasticSearchClient.__new__(ElasticSearchClient)
+    es_client.index_name = 'sequences'
+    es_client._client = SimpleNamespace(indices=StubIndices(exists, meta))
+    es_client.populated = []
+
+    async def health_check():
+        return True
+
+    async def create_index(index):
+        return True
+
+    async def populate_index(index=None, files_dir=None, chuck_size=50):
+        es_client.populated.append(index)
+
+    es_client.health_check = health_check
+    es_client.create_index = create_index
+    es_client.populate_index = populate_index
+    return es_client
+
+
+def test_initialize_es_skips_populated_index():
+    es_client = make_es_client(exists=True, meta={'populated': True})
+    assert asyncio.run(es_client.initialize_es(populate=True)) is False
+    assert es_client.populated == []
+
+
+def test_initialize_es_repopulates_partial_index():
+    es_client = make_es_client(exists=True, meta={})
+    assert asyncio.run(es_client.initialize_es(populate=True)) is True
+    assert es_client._client.indices.deleted == ['sequences']
+    assert es_client.populated == ['sequences']
+
+
+def test_initialize_es_creates_index():
+    es_client = make_es_client(exists=False, meta={})
+    assert asyncio.run(es_client.initialize_es(populate=False)) is False
+    assert asyncio.run(es_client.initialize_es(populate=True)) is True
+    assert es_client.populated == ['sequences']
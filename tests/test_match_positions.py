@@ -0,0 +1,24 @@
+from app.elastic_search.utils.match_positions import (compile_match_pattern,
+                                                      find_match_positions,
+                                                      get_snippets)
+
+
+def test_find_match_positions_overlapping_and_case_insensitive():
+    pattern = compile_match_pattern('aa')
+    assert find_match_positions('aAaTaa', pattern, 2) == [[0, 2], [1, 3], [4, 6]]
+
+
+def test_find_match_positions_escapes_text():
+    pattern = compile_match_pattern('a.')
+    assert find_match_positions('acga.', pattern, 2) == [[3, 5]]
+
+
+def test_find_match_positions_max_positions():
+    pattern = compile_match_pattern('a')
+    assert len(find_match_positions('a' * 500, pattern, 1, max_positions=10)) == 10
+
+
+def test_get_snippets():
+    assert get_snippets('ccccaatttt', [[4, 6]], 2) == ['ccaatt']
+    assert get_snippets('aatt', [[0, 2]], 3) == ['aatt']
+    assert get_snippets('aatt', [[0, 2]], 0) == ['aa']
@@ -0,0 +1,187 @@
+import asyncio
+import os
+
+import pytest
+from starlette.datastructures import State
+
+from app.elastic_search.client import ElasticSearchClient
+from app.elastic_search.utils.snapshot import (ENCODING_2BIT, ENCODING_RAW,
+                                               MISSING_CREATED_AT,
+                                               SnapshotWriter, _from_epoch,
+                                               _to_epoch, open_snapshot,
+                                               pack_bases, unpack_bases)
+from app.main import load_snapshot
+
+
+def write_snapshot_file(path: str, count: int = 3) -> None:
+    writer = SnapshotWriter()
+    for i in range(count):
+        writer.add(f'seq_{i}', {'name': f'n{i}', 'bases': 'acgt' * 10})
+    writer.write(path)
+
+
+@pytest.mark.parametrize('bases', [
+    '',
+    'a',
+    'acgtacgtacgtacgtacgt',
+    'ACGTacgtNNNNacgtRYKMacgt' * 10,
+    'ttttttttttttttttttttttttttttttgN',
+])
+def test_pack_bases_round_trip(bases):
+    encoding, data, patches = pack_bases(bases)
+    assert unpack_bases(encoding, data, len(bases), patches) == bases
+
+
+def test_pack_bases_encodings():
+    assert pack_bases('acgt' * 100)[0] == ENCODING_2BIT
+    assert len(pack_bases('acgt' * 100)[1]) == 100
+    # mostly other characters, the patches would be larger than the sequence
+    assert pack_bases('nrnrnrnrnrnr')[0] == ENCODING_RAW
+    assert pack_bases('acgtéacgt')[0] == ENCODING_RAW
+
+
+def test_created_at():
+    assert _to_epoch(None) == MISSING_CREATED_AT
+    assert _to_epoch('not a date') == MISSING_CREATED_AT
+    assert _from_epoch(_to_epoch('2020-05-20T16:31:52.378940+00:00')) == '2020-05-20T16:31:52.378940+00:00'
+    # numbers are epoch milliseconds, as in ES
+    assert _from_epoch(_to_epoch(1492711916283)) == '2017-04-20T18:11:56.283000+00:00'
+    assert _to_epoch('1492711916283') == _to_epoch(1492711916283)
+    assert _from_epoch(MISSING_CREATED_AT) is None
+
+
+def test_snapshot_store(tmp_path):
+    path = str(tmp_path / 'snapshot.dnasnap')
+    writer = SnapshotWriter()
+    writer.add('b', {
+        'name': 'first', 'bases': 'acgtNNacgt', 'createdAt': '2020-05-20T16:31:52+00:00',
+        'creator': {'id': 'ent_1'}
+    })
+    writer.add('a', {'name': 'other', 'bases': 'gggg', 'createdAt': 1492711916283})
+    writer.add('b', {'name': 'last', 'bases': 'TTTT'})
+    writer.write(path)
+
+    store = open_snapshot(path)
+    try:
+        assert store.count == len(store) == 2
+        assert sorted(store.ids()) == ['a', 'b']
+        # the last document added with an id is kept
+        assert store.get('b') == {
+            'id': 'b', 'name': 'last', 'bases': 'TTTT', 'createdAt': None, 'creator': {'id': ''}
+        }
+        assert store.get('a')['createdAt'] == '2017-04-20T18:11:56.283000+00:00'
+        assert store.get('missing') is None
+        assert store.verify()
+    finally:
+        store.close()
+
+
+def test_snapshot_store_corrupted(tmp_path):
+    path = tmp_path / 'snapshot.dnasnap'
+    writer = SnapshotWriter()
+    writer.add('a', {'name': 'a', 'bases': 'acgt' * 10})
+    writer.write(str(path))
+    data = bytearray(path.read_bytes())
+    data[-1] ^= 0xff
+    path.write_bytes(bytes(data))
+    store = open_snapshot(str(path))
+    try:
+        assert not store.verify()
+    finally:
+        store.close()
+
+
+def test_open_snapshot_invalid(tmp_path):
+    assert open_snapshot(str(tmp_path / 'missing.dnasnap')) is None
+    path = tmp_path / 'invalid.dnasnap'
+    path.write_bytes(b'not a snapshot' * 100)
+    with pytest.raises(Exception):
+        open_snapshot(str(path))
+
+
+def test_open_snapshot_truncated(tmp_path):
+    path = tmp_path / 'snapshot.dnasnap'
+    write_snapshot_file(str(path))
+    data = path.read_bytes()
+    # cut inside the sections, ex: a partially copied file
+    for size in [len(data) - 3, len(data) // 2 + 1]:
+        path.write_bytes(data[:size])
+        with pytest.raises(Exception, match='Invalid snapshot file'):
+            open_snapshot(str(path))
+
+
+def make_state(path: str) -> State:
+    state = State()
+    state.snapshot_path = path
+    state.snapshot = None
+    state.snapshot_mtime = None
+    return state
+
+
+def test_load_snapshot_ignores_invalid_file(tmp_path):
+    path = tmp_path / 'snapshot.dnasnap'
+    path.write_bytes(b'not a snapshot' * 100)
+    state = make_state(str(path))
+    assert load_snapshot(state) is None
+    assert load_snapshot(state) is None
+    # the snapshot is loaded once it is written again
+    write_snapshot_file(str(path))
+    os.utime(path, ns=(0, 0))
+    snapshot = load_snapshot(state)
+    assert snapshot.count == 3
+    snapshot.close()
+
+
+def test_load_snapshot_defers_close_while_in_use(tmp_path):
+    path = tmp_path / 'snapshot.dnasnap'
+    write_snapshot_file(str(path))
+    state = make_state(str(path))
+    old = load_snapshot(state)
+    with old.in_use():
+        write_snapshot_file(str(path), count=5)
+        os.utime(path, ns=(0, 0))
+        new = load_snapshot(state)
+        assert new is not old and new.count == 5
+        # the reload did not unmap the snapshot being read
+        assert old.verify()
+    with pytest.raises(ValueError):
+        old.verify()
+    new.close()
+
+
+SHARDS = {'successful': 1, 'total': 1, 'skipped': 0}
+
+
+class StubScrollClient:
+    def __init__(self, count):
+        self.hits = [
+            {'_id': f'seq_{i}', '_source': {'name': f'n{i}', 'bases': 'acgt' * 10}}
+            for i in range(count)
+        ]
+
+    async def search(self, **kwargs):
+        return {'_scroll_id': 'scroll', 'hits': {'hits': self.hits}, '_shards': SHARDS}
+
+    async def scroll(self, **kwargs):
+        return {'_scroll_id': 'scroll', 'hits': {'hits': []}, '_shards': SHARDS}
+
+    async def clear_scroll(self, **kwargs):
+        return {}
+
+    def options(self, **kwargs):
+        return self
+
+
+def test_write_snapshot(tmp_path, monkeypatch):
+    monkeypatch.setattr('app.elastic_search.client.SNAPSHOT_BATCH_SIZE', 2)
+    es_client = ElasticSearchClient.__new__(ElasticSearchClient)
+    es_client.index_name = 'sequences'
+    es_client._client = StubScrollClient(5)
+    path = str(tmp_path / 'snapshot.dnasnap')
+    assert asyncio.run(es_client.write_snapshot(path)) == 5
+    store = open_snapshot(path)
+    try:
+        assert sorted(store.ids()) == [f'seq_{i}' for i in range(5)]
+        assert store.get('seq_4')['bases'] == 'acgt' * 10
+    finally:
+        store.close()